@@ -1,12 +1,12 @@
 import random
-import numpy as np
-import pyCardDeck
+import cards
 import util
-import copy
 class Agent:
     """
     Taken from Berkely AI, will represent an agent that plays the game
     """
+    bet_estimator = None
+
     def __init__(self, index=0):
         self.index = index
         self.hand = []
@@ -46,6 +46,14 @@ class Agent:
         """
         raise NotImplementedError
 
+    def fingerprint(self):
+        """
+        Identify what the agent plays, for caching game results. Agents that define one must play the same game given
+        the same deal and seed, see evaluation.evaluate_deals
+        :return: str, or None if the agent's games can't be cached
+        """
+        return None
+
     def filter_by_suit(self, suit):
         """
         Helper function to get a list of same suits in hand
@@ -127,7 +135,7 @@ class Agent:
             return result
 
     @staticmethod
-    def convert_card_rank_to_int(card: pyCardDeck.PokerCard):
+    def convert_card_rank_to_int(card: cards.Card):
         if card.rank == "J":
             return 11
         elif card.rank == "Q":
@@ -150,28 +158,43 @@ class RandomAgent(Agent):
 
     def make_bet(self, state, num_players=2):
         """
-        :return: random int from the normal distribution of total rounds / num players
+        :return: expected tricks from the agent's bet_estimator if it has one, else 13
         """
+        if self.bet_estimator is not None:
+            return self.bet_estimator.make_bet(self.hand, num_players)
         return 13
-        """num_turns = round(52/num_players)
-        mu = round(num_turns/2)
-        sigma = 2.0
-        random_distribution = np.random.randn(100000) * sigma + mu
-        bet = round(random.choice(random_distribution))
-        if bet > mu * 2:
-            bet = mu * 2
-        elif bet < 0:
-            bet = 0
-        return bet"""
 
     def getLegalActions(self, state):
         return state.get_legal_moves(self)
 
-class QLearningAgent(Agent):
-
+    def fingerprint(self):
+        if type(self) is RandomAgent and self.bet_estimator is None:
+            return "RandomAgent"
+        return None
 
-    def __init__(self, index=0, num_training=100, epsilon=.1, alpha=.4, gamma=1, q_values={}):
+class QLearningAgent(Agent):
+    reward_multipliers = {"HIGHEST_SPADE": .5, "LOWEST_SPADE": .7, "HIGHEST_SAME_SUIT": 1.5,
+                          "LOWEST_SAME_SUIT_LOSS": .5, "LOWEST_SAME_SUIT_WIN": 4, "LOWEST_SPADE_WIN": .7,
+                          "HIGHEST_NON_SPADE": 1, "LOWEST_NON_SPADE": 1, "LOWEST_OFF_SUIT": 1,
+                          "HIGHEST_SAME_SUIT_LOSS": .5, "HIGHEST_SAME_SUIT_WIN": 1.2}
+    # Defaults for agents pickled before these options existed
+    trace_decay = 0.0
+    trace_cutoff = .01
+    explored = False
+    telemetry = None
+
+    def __init__(self, index=0, num_training=100, epsilon=.1, alpha=.4, gamma=1, q_values={},
+                 reward_multipliers=None, trace_decay=0, trace_cutoff=.01, telemetry=None):
+        """
+        :param reward_multipliers: overrides for the per action multipliers applied to trick rewards
+        :param trace_decay: lambda of Watkins's Q(lambda). 0 is one step Q learning, higher values pass each reward
+            back to the earlier decisions of the episode
+        :param trace_cutoff: eligibility traces that decay below this are dropped
+        :param telemetry: metrics.LearnerTelemetry counting lookups, actions and TD errors, None to count nothing
+        """
         Agent.__init__(self, index=index)
+        if reward_multipliers:
+            self.reward_multipliers = dict(QLearningAgent.reward_multipliers, **reward_multipliers)
         self.episodes_so_far=0.0
         self.accum_train_rewards = 0.0
         self.accum_test_rewards = 0.0
@@ -184,27 +207,45 @@ class QLearningAgent(Agent):
         self.reward_this_episode = 0
         self.episodes_rewards = {0:0}
         self.last_state = None
+        self.last_state_key = None
         self.last_action = None
         self.last_reward = 0
         self.last_score = 0
+        self.trace_decay = float(trace_decay)
+        self.trace_cutoff = trace_cutoff
+        self.traces = {}
+        self.explored = False
+        self.telemetry = telemetry
 
     @classmethod
     def create_optimal_agent(cls, index, trained_agent):
-        result = QLearningAgent(index=index, epsilon=0, q_values=trained_agent.q_values)
-        return result
+        return FrozenQAgent.from_agent(trained_agent, index=index)
 
 
     def start_episode(self):
         self.reward_this_episode = 0
+        self.last_action = None
+        self.last_reward = 0
+        self.traces = {}
         max_episodes = max(self.episodes_rewards)
         self.episodes_rewards[max_episodes+1] = 0
 
     def end_episode(self):
+        """
+        Learn from the reward of the last trick, which holds the win or loss reward, as there is no next state to
+        update from
+        """
+        if self.last_state_key is not None and self.last_action is not None:
+            self.learn(self.create_state_action_rep_from_self(self.last_action), self.last_reward)
+            self.reward_this_episode += self.last_reward
+        self.traces = {}
+        if self.telemetry is not None:
+            self.telemetry.end_episode(self)
         cur_episode = max(self.episodes_rewards)
         self.episodes_rewards[cur_episode] = self.reward_this_episode
 
     def make_bet(self, state, num_players=2):
-        return 13#RandomAgent.make_bet(self, state)
+        return RandomAgent.make_bet(self, state, num_players)
 
     def getLegalActions(self, state):
         """
@@ -288,11 +329,7 @@ class QLearningAgent(Agent):
             raise ValueError("Invalid legal action: " + legal_action)
 
     def get_multiplier_last_action(self):
-        action = self.last_action
-        mult_dict = {"HIGHEST_SPADE": .5, "LOWEST_SPADE":.7, "HIGHEST_SAME_SUIT":1.5,"LOWEST_SAME_SUIT_LOSS":.5,
-                     "LOWEST_SAME_SUIT_WIN": 4, "LOWEST_SPADE_WIN":.7, "HIGHEST_NON_SPADE":1, "LOWEST_NON_SPADE":1,
-                     "LOWEST_OFF_SUIT":1, "HIGHEST_SAME_SUIT_LOSS":.5, "HIGHEST_SAME_SUIT_WIN":1.2}
-        return mult_dict[action]
+        return self.reward_multipliers[self.last_action]
 
     def get_multiplier_last_action_lose(self):
         action = self.last_action
@@ -313,15 +350,32 @@ class QLearningAgent(Agent):
     def getAction(self, state):
         # Pick Actions
         legalActions = self.getLegalActions(state)
+        if self.telemetry is not None:
+            self.record_lookups(state, legalActions)
         exploration = util.flipCoin(self.epsilon)
+        self.explored = exploration
         if exploration:
             exploration_action = random.choice(legalActions)
             action = exploration_action
         else:
             exploitation_action = self.getPolicy(state)
             action = exploitation_action
+        if self.telemetry is not None:
+            self.telemetry.record_action(action, exploration)
         return action
 
+    def record_lookups(self, state, actions):
+        """
+        Count the legal actions of a decision that have a Q value as telemetry hits and the rest as misses, once per
+        decision whether it explores or not
+        """
+        state_key = self.create_state_key(state)
+        hits = 0
+        for action in actions:
+            if state_key + (action,) in self.q_values:
+                hits += 1
+        self.telemetry.record_lookups(hits, len(actions) - hits)
+
     def computeValueFromQValues(self, state):
         """
           Returns max_action Q(state,action)
@@ -332,9 +386,10 @@ class QLearningAgent(Agent):
         actions = self.getLegalActions(state)
         if len(actions) == 0:
             return 0.0
+        state_key = self.create_state_key(state)
         max_val = -9999999
         for action in actions:
-            value = self.get_q_value(state, action)
+            value = self.q_values.get(state_key + (action,), 0.0)
             if value > max_val:
                 max_val = value
         return max_val
@@ -347,9 +402,10 @@ class QLearningAgent(Agent):
         """
         starting_value = self.computeValueFromQValues(state)
         actions = self.getLegalActions(state)
+        state_key = self.create_state_key(state)
         possible_actions = []
         for action in actions:
-            if self.get_q_value(state, action) >= starting_value:
+            if self.q_values.get(state_key + (action,), 0.0) >= starting_value:
                 possible_actions.append(action)
         if len(possible_actions) == 0:
             return None
@@ -366,13 +422,36 @@ class QLearningAgent(Agent):
         "*** YOUR CODE HERE ***"
         # Formula for update from slide:
         # Q(s, a) <- q(s,a) + alpha * [R + discount * max_a Q(s'a,) - Q(s,a)]
-        original_q_value = self.get_q_value(nextState, action, from_self=True)
+        if self.last_state_key is None or action is None:
+            return
         next_q_value = self.computeValueFromQValues(nextState)
-        current_rep = self.create_state_action_rep_from_self(action)
-        next_state_rep = self.create_state_action_rep(nextState, action)
-        updated_q_value = original_q_value + self.alpha * (reward + self.discount * next_q_value - original_q_value)
-        self.set_q_values(action, updated_q_value)
+        self.learn(self.create_state_action_rep_from_self(action), reward + self.discount * next_q_value)
         self.reward_this_episode += reward
+        if self.explored:
+            self.traces.clear()
+
+    def learn(self, state_action, target):
+        """
+        Move Q(state_action) towards target. With trace_decay set, every pair still eligible this episode moves by
+        the same error scaled by its trace. Traces only hold the pairs visited since the last exploratory action,
+        see update
+        """
+        error = target - self.q_values.get(state_action, 0.0)
+        if self.telemetry is not None:
+            self.telemetry.record_update(error)
+        if not self.trace_decay:
+            self.q_values[state_action] = self.q_values.get(state_action, 0.0) + self.alpha * error
+            return
+        traces = self.traces
+        traces[state_action] = 1.0
+        decay = self.discount * self.trace_decay
+        for eligible, trace in list(traces.items()):
+            self.q_values[eligible] = self.q_values.get(eligible, 0.0) + self.alpha * error * trace
+            trace *= decay
+            if trace < self.trace_cutoff:
+                del traces[eligible]
+            else:
+                traces[eligible] = trace
 
     def set_q_values(self, action, updated_q_value):
         state_action_rep = self.create_state_action_rep_from_self(action)
@@ -411,24 +490,23 @@ class QLearningAgent(Agent):
             return 0.0
 
     def create_state_action_rep_from_self(self, action):
-        board =self.create_board_rep_self() + self.create_turns_remaining_rep_self()
-        playing_order = self.last_playing_order
-        return board + (playing_order, action,)
+        return self.last_state_key + (action,)
 
     def create_state_action_rep(self, state, action):
-        playing_order = list(map(lambda x: x.index, state.get_playing_order())).index(self.index)
-        state_action = self.create_state_rep(state) + (playing_order, action,)
-        actions_reps = self.create_actions_rep_state(state)
-        full_state_action = state_action
-        return full_state_action
+        return self.create_state_key(state) + (action,)
+
+    def create_state_key(self, state):
+        """
+        State part of the Q table key: board, turns remaining and seat offset from the player leading the trick.
+        Built from the game's incrementally maintained trick context so no board scan is needed
+        """
+        playing_order = state.context.seat_offsets[self.index]
+        return self.create_state_rep(state) + (playing_order,)
 
     def create_actions_rep_state(self, state):
         actions = self.getLegalActions(state)
         return self.map_legal_actions_to_ints(actions)
 
-    def create_actions_rep_self(self):
-        actions = self.last_legal_actions
-        return self.map_legal_actions_to_ints(actions)
     def map_legal_actions_to_ints(self, actions):
         mult_dict = {"HIGHEST_SPADE":0, "LOWEST_SPADE": 1, "HIGHEST_SAME_SUIT": 2, "LOWEST_SAME_SUIT_LOSS": 3,
                      "LOWEST_SAME_SUIT_WIN": 4, "LOWEST_SPADE_WIN": 5, "HIGHEST_NON_SPADE": 6, "LOWEST_NON_SPADE": 7,
@@ -444,14 +522,18 @@ class QLearningAgent(Agent):
 
 
     def create_action_rep(self, state, action):
-        playing_order = list(map(lambda x: x.index, state.get_playing_order())).index(self.index)
+        playing_order = state.context.seat_offsets[self.index]
         return (playing_order, action,)
 
 
 
     def create_state_rep(self, state):
-        state_action = self.create_board_representation(state) + self.create_turns_remaining_rep(state)
-        return state_action
+        context = state.context
+        if context.winning_card is None:
+            board = ("EMPTY", )
+        else:
+            board = (self.create_card_representation(context.winning_card), )
+        return board + self.create_turns_remaining_rep(state)
 
     def create_hand_representation(self):
         non_spades = self.filter_by_suit("Diamonds") + self.filter_by_suit("Hearts") + \
@@ -460,20 +542,7 @@ class QLearningAgent(Agent):
         return (len(non_spades), len(spades),)
 
     def create_turns_remaining_rep(self, state):
-        total_turns = round(52/len(state.players))
-        turns_left = len(self.hand)
-        percentage = turns_left/total_turns
-        if percentage <= .25:
-            return (25, )
-        elif percentage <= .5:
-            return (50, )
-        elif percentage <= .75:
-            return (75, )
-        else:
-            return (1, )
-
-    def create_turns_remaining_rep_self(self):
-        total_turns = round(52/self.num_players)
+        total_turns = state.context.cards_per_player
         turns_left = len(self.hand)
         percentage = turns_left/total_turns
         if percentage <= .25:
@@ -485,74 +554,103 @@ class QLearningAgent(Agent):
         else:
             return (1, )
 
-    def create_board_representation(self, state, ):
-        board = state.board
-        if not board:
-            return ("EMPTY", )
-        else:
-            result = None
-            if len(board) == 1:
-                return (self.create_card_representation(list(board.values())[0]), )
-            lead_card = self.get_lead_card(state)
-            result = (self.create_card_representation(lead_card), )
-        return result
-
-    def create_board_rep_self(self):
-        board = self.last_board
-        if not board:
-            return ("EMPTY", )
-        else:
-            if len(board) == 1:
-                result =(self.create_card_representation(list(board.values())[0]), )
-                return result
-            lead_card = self.get_lead_card_self()
-            result = (self.create_card_representation(lead_card), )
-        return result
-
-    def get_lead_card(self, state):
-        max_card = state.board[0]
-        max_val = Agent.convert_card_rank_to_int(max_card)
-        lead_suit = state.board[0]
-        for card_index in state.board:
-            card = state.board[card_index]
-            if card.suit == lead_suit and Agent.convert_card_rank_to_int(card) > max_val:
-                max_card = card
-                max_val = Agent.convert_card_rank_to_int(card)
-            elif card.suit == "Spades" and (lead_suit != "Spades" or card.rank > max_val):
-                max_card = card
-                max_val = Agent.convert_card_rank_to_int(card)
-        return max_card
-
-
-    def create_card_representation(self, card: pyCardDeck.PokerCard):
+    def create_card_representation(self, card: cards.Card):
         representation_dict = {"Spades":"S", "Clubs":"NS", "Diamonds":"NS", "Hearts":"NS"}
         rep = representation_dict[card.suit] + str(card.rank)
         return rep
 
     def save_state(self, state):
-        self.last_playing_order = list(map(lambda x: x.index, state.get_playing_order())).index(self.index)
-        #self.last_score = copy.copy(state.scores[self.index])
-        self.last_board = copy.copy(state.board)
-        self.last_hand = copy._deepcopy_list(self.hand, memo={})
-        self.num_players = len(state.players)
-        self.last_legal_actions = self.getLegalActions(state)
-        self.last_lead_card = state.get_lead_card()
-
-    def get_lead_card_self(self):
-        board = self.last_board
-        max_card = board[0]
-        max_val = Agent.convert_card_rank_to_int(max_card)
-        lead_suit = board[0]
-        for card_index in board:
-            card = board[card_index]
-            if card.suit == lead_suit and Agent.convert_card_rank_to_int(card) > max_val:
-                max_card = card
-                max_val = Agent.convert_card_rank_to_int(card)
-            elif card.suit == "Spades" and (lead_suit != "Spades" or Agent.convert_card_rank_to_int(card) > max_val):
-                max_card = card
-                max_val = Agent.convert_card_rank_to_int(card)
-        return max_card
+        """
+        Capture the key of the state the agent is deciding in, so the next update can refer back to it. The key is an
+        immutable tuple built from the game's trick context, so nothing is copied
+        """
+        self.last_state_key = self.create_state_key(state)
+        if self.telemetry is not None and self.hand:
+            self.telemetry.record_state(self.last_state_key)
 
 
+class FrozenQAgent(QLearningAgent):
+    """
+    Greedy policy compiled from a trained QLearningAgent's Q table for evaluation. It only looks up the best action:
+    no exploration, updates, state saving or reward bookkeeping, and it never modifies the trained agent.
+    As it is not exactly a QLearningAgent, Spades.play_turn treats it like any other agent and skips the learning calls
+    """
 
+    def __init__(self, index=0, q_values=None, seed=None):
+        """
+        :param q_values: Q table of a trained agent, keyed by state key + (action,)
+        :param seed: seed for breaking ties between equally valued actions
+        """
+        QLearningAgent.__init__(self, index=index, epsilon=0)
+        self.policy = FrozenQAgent.compile_policy(q_values if q_values is not None else {})
+        self.random = random.Random(seed)
 
+    @classmethod
+    def from_agent(cls, trained_agent, index=None, seed=None):
+        """
+        :param index: index for the frozen agent, defaults to the trained agent's index
+        """
+        if index is None:
+            index = trained_agent.index
+        return cls(index=index, q_values=trained_agent.q_values, seed=seed)
+
+    @staticmethod
+    def compile_policy(q_values):
+        """
+        Group the Q table by state so a decision needs a single lookup for the state
+        :return: dict of state key to dict of action to Q value
+        """
+        policy = {}
+        for state_action, value in q_values.items():
+            state_key = state_action[:-1]
+            if state_key not in policy:
+                policy[state_key] = {}
+            policy[state_key][state_action[-1]] = value
+        return policy
+
+    def start_episode(self):
+        pass
+
+    def end_episode(self):
+        pass
+
+    def save_state(self, state):
+        pass
+
+    def update(self, action, nextState, reward):
+        pass
+
+    def fingerprint(self):
+        """
+        :return: hash of the compiled policy
+        """
+        if self.bet_estimator is not None:
+            return None
+        import hashlib
+        digest = hashlib.sha256(type(self).__name__.encode())
+        entries = [repr((state_key, action, value)) for state_key, action_values in self.policy.items()
+                   for action, value in action_values.items()]
+        for entry in sorted(entries):
+            digest.update(entry.encode())
+        return digest.hexdigest()
+
+    def getPolicy(self, state):
+        action_values = self.policy.get(self.create_state_key(state), {})
+        best_value = None
+        best_actions = []
+        for action in self.getLegalActions(state):
+            value = action_values.get(action, 0.0)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_actions = [action]
+            elif value == best_value:
+                best_actions.append(action)
+        if not best_actions:
+            return None
+        return self.random.choice(best_actions)
+
+    def getAction(self, state):
+        """
+        :return: the card for the greedy action
+        """
+        return self.map_legal_actions_to_action(self.getPolicy(state), state)
@@ -0,0 +1,80 @@
+"""
+Micro benchmarks for the game engine and agents, run through cli.py benchmark
+"""
+import random
+import time
+from agents import RandomAgent
+from evaluation import play_game
+
+
+def engine_throughput(num_games=1000, num_players=2, seed=0):
+    """
+    Play games between RandomAgents with seeded deals
+    :return: dict with games, seconds and games_per_second
+    """
+    rng = random.Random(seed)
+    players = [RandomAgent(index) for index in range(num_players)]
+    start = time.perf_counter()
+    for game_number in range(num_games):
+        play_game(players, deal_seed=rng.randrange(2 ** 32))
+    seconds = time.perf_counter() - start
+    return {"games": num_games, "seconds": seconds, "games_per_second": num_games / seconds}
+
+
+def episodes_to_win_rate(target=.8, trace_decay=0, eval_every=50, max_games=1000, eval_games=200, num_players=2,
+                         seed=0, learner=None):
+    """
+    Train a QLearningAgent against RandomAgents, evaluating its frozen policy on a fixed deal set every eval_every
+    games
+    :param trace_decay: lambda for the learner, 0 being one step Q learning
+    :param learner: QLearningAgent with index 0 to train instead of a new one
+    :return: games trained when the win rate first reached target, 0 if it already had, None if it didn't within
+        max_games
+    """
+    from agents import QLearningAgent, FrozenQAgent
+    from evaluation import train, deal_set, evaluate_deals
+    random.seed(seed)
+    rng = random.Random(seed)
+    if learner is None:
+        learner = QLearningAgent(0, trace_decay=trace_decay)
+    opponents = [RandomAgent(index) for index in range(1, num_players)]
+    deals = deal_set(eval_games, seed=seed + 1)
+    for games in range(0, max_games + 1, eval_every):
+        if games:
+            train(learner, opponents, eval_every, rng)
+        if evaluate_deals(FrozenQAgent.from_agent(learner), opponents, deals, seed)["win_rate"] >= target:
+            return games
+    return None
+
+
+def compare_trace_decay(values=(0, .5, .8), seeds=(0, 1, 2), **kwargs):
+    """
+    :param kwargs: passed to episodes_to_win_rate
+    :return: dict of trace_decay to the list of episodes_to_win_rate results over seeds
+    """
+    return {value: [episodes_to_win_rate(trace_decay=value, seed=seed, **kwargs) for seed in seeds]
+            for value in values}
+
+
+def transfer_games_saved(target=.3, source_players=2, target_players=4, source_games=3000, seeds=(0, 1, 2),
+                         eval_games=1000, **kwargs):
+    """
+    Train a source_players agent, then compare the games a target_players agent needs to reach target when warm
+    started from it and when trained from scratch
+    :param kwargs: passed to episodes_to_win_rate
+    :return: dict with warm and cold, lists of episodes_to_win_rate results over seeds
+    """
+    from agents import QLearningAgent
+    from evaluation import train
+    from transfer import warm_start
+    results = {"warm": [], "cold": []}
+    for seed in seeds:
+        random.seed(seed)
+        source = QLearningAgent(0)
+        train(source, [RandomAgent(index) for index in range(1, source_players)], source_games, random.Random(seed))
+        learner = warm_start(source, source_players, target_players)
+        results["warm"].append(episodes_to_win_rate(target, num_players=target_players, eval_games=eval_games,
+                                                    seed=seed, learner=learner, **kwargs))
+        results["cold"].append(episodes_to_win_rate(target, num_players=target_players, eval_games=eval_games,
+                                                    seed=seed, **kwargs))
+    return results
@@ -0,0 +1,145 @@
+"""
+Monte Carlo estimate of the number of tricks a hand will take, used to place bets
+"""
+import os
+import pickle
+import random
+from collections import OrderedDict
+import cards
+import canonical
+
+
+class BetEstimator:
+    """
+    Estimates expected tricks for a hand by dealing the unseen cards to random opponents and simulating the rest of
+    the game. Results are cached by a canonical signature of the hand and can be saved to disk so later runs reuse
+    them. Used as a context manager the cache is saved on exit:
+
+        with BetEstimator(path="bets.p") as estimator:
+            agent.bet_estimator = estimator
+            ...
+    """
+
+    def __init__(self, num_simulations=200, max_entries=100000, path=None, seed=None):
+        """
+        :param num_simulations: games simulated per new signature
+        :param max_entries: cache size, least recently used signatures are dropped past it
+        :param path: file the cache is loaded from and saved to, None keeps it in memory only
+        :param seed: seed of the estimator's own random generator so estimating doesn't disturb the global one
+        """
+        self.num_simulations = num_simulations
+        self.max_entries = max_entries
+        self.path = path
+        self.random = random.Random(seed)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def hand_signature(hand_ids, num_players):
+        """
+        Spades are kept exactly while the other three suits are put in canonical order, as they are interchangeable
+        in this game
+        :param hand_ids: list of card ids
+        """
+        mask = canonical.canonical_hand(hand_ids)[0]
+        return num_players, mask
+
+    def expected_tricks(self, hand, num_players=2):
+        """
+        :param hand: list of PokerCards
+        :return: average number of tricks the hand took over the simulations
+        """
+        hand_ids = [cards.card_id(card) for card in hand]
+        signature = BetEstimator.hand_signature(hand_ids, num_players)
+        if signature in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(signature)
+            return self.cache[signature]
+        self.misses += 1
+        total = 0
+        for i in range(self.num_simulations):
+            total += self.simulate(hand_ids, num_players)
+        estimate = total / self.num_simulations
+        self.cache[signature] = estimate
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return estimate
+
+    def make_bet(self, hand, num_players=2):
+        return round(self.expected_tricks(hand, num_players))
+
+    def simulate(self, hand_ids, num_players):
+        """
+        Play out one deal of the unseen cards. Opponents play random legal cards while the hand being estimated wins
+        with its lowest winning card when it can and otherwise throws its lowest legal card
+        :return: tricks taken by the hand
+        """
+        hand_ids = set(hand_ids)
+        unseen = [card for card in range(52) if card not in hand_ids]
+        self.random.shuffle(unseen)
+        hand_size = len(hand_ids)
+        hands = [sorted(hand_ids)]
+        for seat in range(1, num_players):
+            hands.append(unseen[(seat - 1) * hand_size:seat * hand_size])
+        leader = self.random.randrange(num_players)
+        tricks = 0
+        while hands[0]:
+            trick = []
+            for offset in range(num_players):
+                seat = (leader + offset) % num_players
+                lead_suit = trick[0] // 13 if trick else None
+                legal = cards.legal_card_ids(hands[seat], lead_suit)
+                if seat == 0:
+                    card = BetEstimator.cheapest_winner(legal, trick)
+                else:
+                    card = self.random.choice(legal)
+                hands[seat].remove(card)
+                trick.append(card)
+            leader = (leader + cards.trick_winner(trick)) % num_players
+            if leader == 0:
+                tricks += 1
+        return tricks
+
+    @staticmethod
+    def cheapest_winner(legal, trick):
+        """
+        :return: the lowest legal card that would currently win the trick, or the lowest legal card if none would
+        """
+        by_strength = sorted(legal, key=lambda card: (card < 13, card % 13))
+        if not trick:
+            return by_strength[0]
+        for card in by_strength:
+            if cards.trick_winner(trick + [card]) == len(trick):
+                return card
+        return by_strength[0]
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            self.cache = pickle.load(f)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def save(self):
+        """
+        Write the cache to path, via a temporary file so an interrupted save leaves the previous cache intact
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(self.cache, f)
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        """
+        Save the cache if the estimator has a path
+        """
+        if self.path is not None:
+            self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
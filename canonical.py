@@ -0,0 +1,83 @@
+"""
+Canonical forms under the symmetry of the three non spade suits. Hearts, Diamonds and Clubs play identically, so any
+position is equivalent to the one obtained by permuting them. Mapping positions to a canonical representative lets
+caches and tables store one entry for up to 6 equivalent positions.
+
+A permutation is a tuple perm where perm[suit] is the canonical suit index of the original suit index,
+perm[0] is always 0 as spades never move.
+"""
+import cards
+
+IDENTITY = (0, 1, 2, 3)
+
+
+def suit_key(masks, board, suit):
+    """
+    Everything that distinguishes a suit within a position: its ranks in each mask and where it appears on the board
+    """
+    in_masks = tuple(cards.suit_bits(mask, suit) for mask in masks)
+    on_board = tuple(card % 13 + 1 if card // 13 == suit else 0 for card in board)
+    return in_masks, on_board
+
+
+def canonical_permutation(masks, board=()):
+    """
+    :param masks: card masks describing the position, e.g. hands followed by the played cards mask
+    :param board: card ids on the board in the order played
+    :return: permutation sending the position to its canonical form
+    """
+    order = sorted([1, 2, 3], key=lambda suit: suit_key(masks, board, suit), reverse=True)
+    perm = [0, 0, 0, 0]
+    for canonical_suit, suit in enumerate(order, start=1):
+        perm[suit] = canonical_suit
+    return tuple(perm)
+
+
+def inverse_permutation(perm):
+    inverse = [0, 0, 0, 0]
+    for suit, canonical_suit in enumerate(perm):
+        inverse[canonical_suit] = suit
+    return tuple(inverse)
+
+
+def permute_card(card_id, perm):
+    return perm[card_id // 13] * 13 + card_id % 13
+
+
+def permute_mask(mask, perm):
+    result = 0
+    for suit in range(4):
+        result |= cards.suit_bits(mask, suit) << (perm[suit] * 13)
+    return result
+
+
+def canonical_hand(hand_ids):
+    """
+    :param hand_ids: list of card ids
+    :return: (canonical mask of the hand, permutation used)
+    """
+    mask = 0
+    for card in hand_ids:
+        mask |= 1 << card
+    perm = canonical_permutation([mask])
+    return permute_mask(mask, perm), perm
+
+
+def canonical_board(board_ids):
+    """
+    :return: (tuple of canonical card ids in play order, permutation used)
+    """
+    perm = canonical_permutation([], board_ids)
+    return tuple(permute_card(card, perm) for card in board_ids), perm
+
+
+def canonical_position(masks, board=()):
+    """
+    :param masks: card masks making up the position, the order is kept and matters for the result
+    :param board: card ids on the board in play order
+    :return: (tuple of canonical masks, tuple of canonical board ids, permutation used). Apply
+        inverse_permutation(perm) to a canonical move to get the move in the original position
+    """
+    perm = canonical_permutation(masks, board)
+    canonical_masks = tuple(permute_mask(mask, perm) for mask in masks)
+    return canonical_masks, tuple(permute_card(card, perm) for card in board), perm
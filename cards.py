@@ -0,0 +1,229 @@
+"""
+Integer encoding of cards so game information can be stored in bitmasks and lookup tables.
+A card id is suit_index * 13 + (rank - 2), so each suit owns 13 consecutive bits of a mask.
+Only the standard library is used so the engine imports quickly
+"""
+SUITS = ["Spades", "Hearts", "Diamonds", "Clubs"]
+SUIT_INDEX = {"Spades": 0, "Hearts": 1, "Diamonds": 2, "Clubs": 3}
+SPADES = 0
+FULL_SUIT = (1 << 13) - 1
+FULL_DECK = (1 << 52) - 1
+RANK_VALUES = {"J": 11, "Q": 12, "K": 13, "A": 14}
+RANK_STRINGS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+RANK_NAMES = ["Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten", "Jack", "Queen", "King", "Ace"]
+# Card ids in the order of pyCardDeck's standard deck, so unseeded games keep dealing the same hands
+STANDARD_DECK_ORDER = [5, 15, 42, 30, 3, 24, 35, 49, 32, 44, 26, 50, 25, 51, 7, 20, 18, 4, 0, 31, 6, 27, 40, 22, 9, 48,
+                       19, 21, 11, 2, 39, 46, 1, 38, 43, 12, 10, 14, 17, 8, 33, 28, 36, 29, 45, 41, 37, 13, 34, 16, 23,
+                       47]
+
+
+class Card:
+    """
+    Playing card with the same attributes as pyCardDeck.PokerCard, and like it equal to any card with the same name,
+    so the two can be mixed
+    """
+
+    def __init__(self, suit: str, rank, name: str):
+        """
+        :param rank: int or one of "J", "Q", "K", "A"
+        :param name: rank name, e.g. "Seven" for the Seven of Spades
+        """
+        self.suit = suit
+        self.rank = rank
+        self.name = name + " of " + suit
+
+    def __eq__(self, other):
+        return self.name == getattr(other, "name", other)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "Card(" + repr(self.name) + ")"
+
+
+def create_card(suit, rank):
+    return Card(suit, rank, RANK_NAMES[rank_to_int(rank) - 2])
+
+
+def standard_deck():
+    """
+    :return: list of the 52 cards in standard deck order
+    """
+    return [card_from_id(card_id) for card_id in STANDARD_DECK_ORDER]
+
+
+def rank_to_int(rank):
+    if rank in RANK_VALUES:
+        return RANK_VALUES[rank]
+    return int(rank)
+
+
+def card_id(card):
+    """
+    :param card: PokerCard
+    :return: int from 0 to 51
+    """
+    return SUIT_INDEX[card.suit] * 13 + rank_to_int(card.rank) - 2
+
+
+def card_from_id(card_id):
+    """
+    :return: Card named like the cards of the standard deck
+    """
+    return Card(SUITS[card_id // 13], RANK_STRINGS[card_id % 13], RANK_NAMES[card_id % 13])
+
+
+def card_suit(card_id):
+    return card_id // 13
+
+
+def card_rank(card_id):
+    """
+    :return: rank as an int from 2 to 14
+    """
+    return card_id % 13 + 2
+
+
+def cards_to_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card_id(card)
+    return mask
+
+
+def suit_bits(mask, suit_index):
+    """
+    :return: the 13 bit rank mask of a suit, bit 0 being the two
+    """
+    return (mask >> (suit_index * 13)) & FULL_SUIT
+
+
+NO_LEAD = 4
+SUIT_BITS = {"Spades": 1, "Hearts": 2, "Diamonds": 4, "Clubs": 8}
+
+
+def build_legal_suits():
+    """
+    Table of the suits that may be played, indexed by held_suits * 5 + lead, where held_suits has bit n set when the
+    hand holds suit n and lead is the lead suit index or NO_LEAD on an empty board.
+    Leading, spades are only allowed from an all spade hand. Following, a player holding the lead suit plays it or a
+    spade (only spades when spades were led) and a player without it may play anything
+    """
+    table = bytearray(16 * 5)
+    for held in range(16):
+        table[held * 5 + NO_LEAD] = held & 0b1110 if held & 0b1110 else held
+        for lead in range(4):
+            if held >> lead & 1:
+                table[held * 5 + lead] = (1 << lead) | 1
+            else:
+                table[held * 5 + lead] = held
+    return bytes(table)
+
+
+def build_trick_strength():
+    """
+    Table of the strength of each card in a trick, indexed by lead * 52 + card. Spades rank above the lead suit and
+    other suits are worth 0, so the winner of a trick is the card with the highest strength
+    """
+    table = bytearray(4 * 52)
+    for lead in range(4):
+        for card in range(52):
+            if card < 13:
+                table[lead * 52 + card] = 14 + card
+            elif card // 13 == lead:
+                table[lead * 52 + card] = 1 + card % 13
+    return bytes(table)
+
+
+def build_two_card_winner():
+    """
+    Table of the winning position of a two card trick, indexed by lead card * 52 + second card
+    """
+    table = bytearray(52 * 52)
+    for lead_card in range(52):
+        strengths = TRICK_STRENGTH[lead_card // 13 * 52:lead_card // 13 * 52 + 52]
+        for card in range(52):
+            table[lead_card * 52 + card] = int(strengths[card] > strengths[lead_card])
+    return bytes(table)
+
+
+LEGAL_SUITS = build_legal_suits()
+TRICK_STRENGTH = build_trick_strength()
+TWO_CARD_WINNER = build_two_card_winner()
+
+
+def legal_card_ids(hand, lead_suit):
+    """
+    Same rules as Spades.get_legal_moves on card ids
+    :param hand: list of card ids
+    :param lead_suit: suit index of the card leading the trick, None if the board is empty
+    :return: list of card ids that may be played
+    """
+    held = 0
+    for card in hand:
+        held |= 1 << (card // 13)
+    allowed = LEGAL_SUITS[held * 5 + (NO_LEAD if lead_suit is None else lead_suit)]
+    if allowed == held:
+        return list(hand)
+    return [card for card in hand if allowed >> (card // 13) & 1]
+
+
+SUIT_MASKS = [sum(FULL_SUIT << 13 * suit for suit in range(4) if suits >> suit & 1) for suits in range(16)]
+
+
+def legal_mask(hand_mask, lead_suit):
+    """
+    Same rules as Spades.get_legal_moves on a bitmask hand, for simulators
+    :param lead_suit: suit index of the card leading the trick, NO_LEAD if the board is empty
+    :return: bitmask of the cards that may be played
+    """
+    held = 0
+    for suit in range(4):
+        if hand_mask >> 13 * suit & FULL_SUIT:
+            held |= 1 << suit
+    return hand_mask & SUIT_MASKS[LEGAL_SUITS[held * 5 + lead_suit]]
+
+
+def trick_winner(trick):
+    """
+    :param trick: list of card ids in the order they were played
+    :return: position in the trick of the winning card
+    """
+    if len(trick) == 2:
+        return TWO_CARD_WINNER[trick[0] * 52 + trick[1]]
+    offset = trick[0] // 13 * 52
+    winner = 0
+    best = TRICK_STRENGTH[offset + trick[0]]
+    for position in range(1, len(trick)):
+        strength = TRICK_STRENGTH[offset + trick[position]]
+        if strength > best:
+            best = strength
+            winner = position
+    return winner
+
+
+def trick_winners_batch(tricks):
+    """
+    Vectorised trick_winner over the same table, for simulators playing many games at once
+    :param tricks: numpy int array of shape (games, players) of card ids in play order
+    :return: numpy array of the winning position of each trick
+    """
+    import numpy as np
+    strength = np.frombuffer(TRICK_STRENGTH, dtype=np.uint8)
+    return np.argmax(strength[tricks[:, :1] // 13 * 52 + tricks], axis=1)
+
+
+def mask_to_ids(mask):
+    """
+    :return: list of card ids set in mask, in increasing order
+    """
+    ids = []
+    while mask:
+        low_bit = mask & -mask
+        ids.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return ids
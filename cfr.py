@@ -0,0 +1,209 @@
+"""
+Outcome sampling Monte Carlo CFR over the QLearningAgent abstraction.
+
+An information set is QLearningAgent's state key: the winning card on the board, the turns remaining bucket and the
+seat offset from the leader. The actions are its abstract actions (HIGHEST_NON_SPADE, LOWEST_SAME_SUIT_WIN, ...),
+numbered as in QLearningAgent.map_legal_actions_to_ints. Regrets and average strategies are NumPy arrays of
+information sets by actions, so the abstract game is small enough to hold in full.
+
+Training samples games in batches with every seat playing the current strategy. In each game one seat, the
+traverser, explores with probability epsilon, and its sampled regrets are added once per batch. The utility is the
+traverser's share of the win under simple scoring, centred on 1 / num_players. The average strategy is exported to a
+CFRAgent.
+"""
+import hashlib
+import random
+import numpy as np
+import cards
+from agents import FrozenQAgent
+from spades import Spades
+
+ACTIONS = ["HIGHEST_SPADE", "LOWEST_SPADE", "HIGHEST_SAME_SUIT", "LOWEST_SAME_SUIT_LOSS", "LOWEST_SAME_SUIT_WIN",
+           "LOWEST_SPADE_WIN", "HIGHEST_NON_SPADE", "LOWEST_NON_SPADE", "LOWEST_OFF_SUIT", "HIGHEST_SAME_SUIT_LOSS",
+           "HIGHEST_SAME_SUIT_WIN"]
+BOARDS = ["EMPTY"] + [prefix + rank for prefix in ["S", "NS"] for rank in cards.RANK_STRINGS]
+BOARD_INDEX = {board: index for index, board in enumerate(BOARDS)}
+TURN_BUCKETS = {1: 0, 25: 1, 50: 2, 75: 3}
+
+
+def num_infosets(num_players):
+    return len(BOARDS) * len(TURN_BUCKETS) * num_players
+
+
+def infoset_index(state_key, num_players):
+    """
+    :param state_key: QLearningAgent.create_state_key result
+    """
+    board, turns, offset = state_key
+    return (BOARD_INDEX[board] * len(TURN_BUCKETS) + TURN_BUCKETS[turns]) * num_players + offset
+
+
+def legal_strategy(row, action_ids):
+    """
+    Regret matching restricted to the legal actions
+    :param row: positive regrets or strategy sums of an information set
+    :return: list of probabilities of action_ids, uniform if none is positive
+    """
+    total = 0.0
+    for action in action_ids:
+        total += row[action]
+    if total <= 0:
+        return [1 / len(action_ids)] * len(action_ids)
+    return [row[action] / total for action in action_ids]
+
+
+def sample(probabilities, rng):
+    threshold = rng.random()
+    for position, probability in enumerate(probabilities):
+        threshold -= probability
+        if threshold < 0:
+            return position
+    return len(probabilities) - 1
+
+
+class CFRTrainer:
+
+    def __init__(self, num_players=2, epsilon=.6, seed=None):
+        """
+        :param epsilon: probability that the traverser samples uniformly instead of from the current strategy
+        """
+        self.num_players = num_players
+        self.epsilon = epsilon
+        self.rng = random.Random(seed)
+        self.regrets = np.zeros((num_infosets(num_players), len(ACTIONS)))
+        self.strategy_sum = np.zeros((num_infosets(num_players), len(ACTIONS)))
+        self.games = 0
+        self.seats = [CFRAgent(index) for index in range(num_players)]
+
+    def train(self, num_games, batch_size=100):
+        for start in range(0, num_games, batch_size):
+            self.train_batch(min(batch_size, num_games - start))
+
+    def train_batch(self, batch_size):
+        """
+        Sample batch_size games against the strategy as it stands, then add up all their regret and strategy updates
+        """
+        positive = np.maximum(self.regrets, 0).tolist()
+        regret_updates = ([], [], [])
+        strategy_updates = ([], [], [])
+        for game_number in range(batch_size):
+            self.sample_game(positive, self.rng.randrange(self.num_players), regret_updates, strategy_updates)
+        for table, (rows, columns, values) in ((self.regrets, regret_updates), (self.strategy_sum, strategy_updates)):
+            if rows:
+                np.add.at(table, (np.array(rows), np.array(columns)), np.array(values))
+        self.games += batch_size
+
+    def sample_game(self, positive, traverser, regret_updates, strategy_updates):
+        rng = self.rng
+        for seat in self.seats:
+            seat.hand = []
+        game = Spades(self.seats, simple_scoring=True, deal_seed=rng.randrange(2 ** 32))
+        decisions = game.iter_play()
+        decision = next(decisions)
+        nodes = []
+        reach_ratio = 1.0
+        while True:
+            player = decision.player
+            legal = player.legal_abstract_actions(game)
+            action_ids = player.map_legal_actions_to_ints(legal)
+            infoset = infoset_index(player.create_state_key(game), self.num_players)
+            strategy = legal_strategy(positive[infoset], action_ids)
+            if player.index == traverser:
+                explore = self.epsilon / len(action_ids)
+                sampling = [explore + (1 - self.epsilon) * probability for probability in strategy]
+                choice = sample(sampling, rng)
+                for action, probability in zip(action_ids, strategy):
+                    strategy_updates[0].append(infoset)
+                    strategy_updates[1].append(action)
+                    strategy_updates[2].append(reach_ratio * probability)
+                reach_ratio *= strategy[choice] / sampling[choice]
+                nodes.append((infoset, action_ids, strategy, choice, sampling[choice]))
+            else:
+                choice = sample(strategy, rng)
+            try:
+                decision = decisions.send(player.map_legal_actions_to_action(legal[choice], game))
+            except StopIteration:
+                break
+        best = max(game.final_scores.values())
+        winners = list(game.final_scores.values()).count(best)
+        utility = (1 / winners if game.final_scores[traverser] == best else 0.0) - 1 / self.num_players
+        sampled_reach = 1.0
+        for node in nodes:
+            sampled_reach *= node[4]
+        weight = utility / sampled_reach
+        tail = 1.0
+        for infoset, action_ids, strategy, choice, sampling in reversed(nodes):
+            chosen = strategy[choice]
+            for position, action in enumerate(action_ids):
+                regret_updates[0].append(infoset)
+                regret_updates[1].append(action)
+                regret_updates[2].append(weight * tail * ((position == choice) - chosen))
+            tail *= chosen
+
+    def average_strategy(self):
+        """
+        :return: array of information sets by actions, rows summing to 1 where the set was reached
+        """
+        totals = self.strategy_sum.sum(axis=1, keepdims=True)
+        return np.divide(self.strategy_sum, totals, out=np.zeros_like(self.strategy_sum), where=totals > 0)
+
+    def create_agent(self, index=0, seed=None, greedy=False):
+        return CFRAgent(index, self.average_strategy(), seed, greedy)
+
+    def save(self, path):
+        np.savez(path, regrets=self.regrets, strategy_sum=self.strategy_sum, games=self.games)
+
+    @classmethod
+    def load(cls, path, epsilon=.6, seed=None):
+        data = np.load(path)
+        trainer = cls(data["regrets"].shape[0] // (len(BOARDS) * len(TURN_BUCKETS)), epsilon, seed)
+        trainer.regrets = data["regrets"]
+        trainer.strategy_sum = data["strategy_sum"]
+        trainer.games = int(data["games"])
+        return trainer
+
+
+class CFRAgent(FrozenQAgent):
+    """
+    Plays a CFR average strategy over the QLearningAgent abstraction. Like FrozenQAgent it never learns
+    """
+
+    def __init__(self, index=0, strategy=None, seed=None, greedy=False):
+        """
+        :param strategy: average strategy from CFRTrainer, None to play uniformly over the legal actions
+        :param greedy: play the most likely action rather than sampling the strategy
+        """
+        FrozenQAgent.__init__(self, index=index, seed=seed)
+        self.strategy = strategy
+        self.greedy = greedy
+
+    def legal_abstract_actions(self, state):
+        """
+        getLegalActions without the actions whose card breaks the follow suit rule, e.g. LOWEST_SPADE_WIN while
+        holding the lead suit, which Spades.iter_play would reject
+        """
+        actions = self.getLegalActions(state)
+        legal_cards = state.get_legal_moves(self)
+        legal = [action for action in actions if self.map_legal_actions_to_action(action, state) in legal_cards]
+        return legal if legal else actions
+
+    def getPolicy(self, state):
+        legal = self.legal_abstract_actions(state)
+        if not legal:
+            return None
+        if self.strategy is None:
+            return self.random.choice(legal)
+        num_players = self.strategy.shape[0] // (len(BOARDS) * len(TURN_BUCKETS))
+        row = self.strategy[infoset_index(self.create_state_key(state), num_players)]
+        probabilities = legal_strategy(row, self.map_legal_actions_to_ints(legal))
+        if self.greedy:
+            return legal[probabilities.index(max(probabilities))]
+        return legal[sample(probabilities, self.random)]
+
+    def fingerprint(self):
+        if self.bet_estimator is not None:
+            return None
+        digest = hashlib.sha256(("CFRAgent-%s" % self.greedy).encode())
+        if self.strategy is not None:
+            digest.update(np.ascontiguousarray(self.strategy).tobytes())
+        return digest.hexdigest()
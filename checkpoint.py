@@ -0,0 +1,198 @@
+"""
+Crash safe, resumable training. run_resumable trains in chunks of snapshot_every games and after each chunk snapshots
+the players, with their Q tables and reward logs, the episode counter and the state of both the global random module
+and the seating and deal RNG. Snapshots are pickled between games, so they are consistent, then written to a temporary
+file, synced and renamed by a background thread while training goes on. Running it again on the same directory
+resumes from the latest snapshot and plays exactly the games an uninterrupted run would have:
+
+    learner = run_resumable("run1", 1000000, QLearningAgent(0), [RandomAgent(1)], snapshot_every=10000)
+
+Per game metrics, and the rows of a learner's metrics.LearnerTelemetry, are buffered and appended to their CSV files
+just before the snapshot covering them is written. Each snapshot records the length its CSV files should have, and
+resuming truncates them to it, so rows written for games after the snapshot are dropped rather than repeated
+"""
+import csv
+import io
+import os
+import pickle
+import random
+import threading
+from evaluation import train
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".p"
+
+
+def snapshot_path(directory, episode):
+    return os.path.join(directory, "%s%09d%s" % (SNAPSHOT_PREFIX, episode, SNAPSHOT_SUFFIX))
+
+
+def list_snapshots(directory):
+    """
+    :return: snapshot paths in directory, oldest first
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+def latest_snapshot(directory):
+    snapshots = list_snapshots(directory)
+    return snapshots[-1] if snapshots else None
+
+
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def atomic_write(path, data):
+    """
+    Write bytes to path so that path holds either its old content or all of data, even if the process dies
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def encode_rows(rows):
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+    return text.getvalue().encode("utf-8")
+
+
+def truncate_csv_files(lengths):
+    """
+    Cut CSV files back to the lengths a snapshot recorded, dropping rows appended after it
+    :param lengths: dict of path to length in bytes
+    """
+    for path, length in lengths.items():
+        if os.path.exists(path) and os.path.getsize(path) > length:
+            with open(path, "r+b") as f:
+                f.truncate(length)
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots on a background thread, one at a time. Only the latest keep snapshots are kept
+    """
+
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        self.thread = None
+        self.error = None
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, episode, state, appends=()):
+        """
+        Pickle state now and write it in the background, waiting for the previous snapshot first
+        :param appends: (CSV file, rows) pairs, the rows being appended to the file before the snapshot is written.
+            The snapshot stores the length of every file with its rows as csv_lengths
+        """
+        self.wait()
+        encoded = []
+        lengths = {}
+        for path, rows in appends:
+            data = encode_rows(rows)
+            lengths[path] = (os.path.getsize(path) if os.path.exists(path) else 0) + len(data)
+            encoded.append((path, data))
+        data = pickle.dumps(dict(state, csv_lengths=lengths), protocol=pickle.HIGHEST_PROTOCOL)
+        self.thread = threading.Thread(target=self.write, args=(episode, data, encoded))
+        self.thread.start()
+
+    def write(self, episode, data, encoded):
+        try:
+            for path, rows in encoded:
+                if rows:
+                    with open(path, "ab") as f:
+                        f.write(rows)
+                        f.flush()
+                        os.fsync(f.fileno())
+            atomic_write(snapshot_path(self.directory, episode), data)
+            for old_snapshot in list_snapshots(self.directory)[:-self.keep]:
+                os.remove(old_snapshot)
+        except Exception as error:
+            self.error = error
+
+    def wait(self):
+        """
+        Block until the snapshot being written is on disk
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        self.wait()
+
+
+def run_resumable(directory, num_games, learner=None, opponents=None, seed=0, snapshot_every=1000,
+                  metrics_path=None, keep=3):
+    """
+    Train learner against opponents for num_games games in total, as evaluation.train does, snapshotting to
+    directory. If directory holds a snapshot the run continues from it and learner and opponents are ignored
+    :param metrics_path: CSV file for metrics.MetricsWriter rows, written in step with the snapshots
+    :return: the learner
+    """
+    from metrics import MetricsWriter
+    rng = random.Random()
+    path = latest_snapshot(directory)
+    if path is not None:
+        snapshot = load_snapshot(path)
+        learner = snapshot["learner"]
+        opponents = snapshot["opponents"]
+        episode = snapshot["episode"]
+        random.setstate(snapshot["random_state"])
+        rng.setstate(snapshot["rng_state"])
+        truncate_csv_files(snapshot["csv_lengths"])
+    elif learner is None:
+        raise ValueError("No snapshot in " + directory + " and no learner to start from")
+    else:
+        episode = 0
+        random.seed(seed)
+        rng.seed(seed)
+    metrics = None
+    if metrics_path is not None:
+        metrics = MetricsWriter(metrics_path, chunk_size=float("inf"))
+        if path is not None:
+            metrics.episode = snapshot["metrics_episode"]
+    telemetry = getattr(learner, "telemetry", None)
+    if telemetry is not None:
+        telemetry.rows = []
+    writer = SnapshotWriter(directory, keep)
+
+    def save():
+        appends = []
+        if metrics is not None:
+            appends.append((metrics_path, metrics.rows))
+            metrics.rows = []
+        if telemetry is not None:
+            appends.append((telemetry.path, telemetry.rows))
+            telemetry.rows = []
+        writer.save(episode, {"learner": learner, "opponents": opponents, "episode": episode,
+                              "random_state": random.getstate(), "rng_state": rng.getstate(),
+                              "metrics_episode": metrics.episode if metrics is not None else episode}, appends)
+
+    try:
+        if path is None:
+            # records where the CSV files start, so a crash before the first chunk is done can be cut back too
+            save()
+        while episode < num_games:
+            chunk = min(snapshot_every, num_games - episode)
+            train(learner, opponents, chunk, rng, metrics)
+            episode += chunk
+            save()
+    finally:
+        writer.close()
+        if telemetry is not None:
+            telemetry.rows = None
+    return learner
@@ -0,0 +1,269 @@
+"""
+Command line entry point for training, evaluation, benchmarks and tournaments:
+
+    python cli.py train 10000 --output agent.p
+    python cli.py evaluate agent.p --games 1000
+    python cli.py benchmark --games 1000
+    python cli.py tournament a.p b.p --games 100
+    python cli.py broker queue.db --host 0.0.0.0 --port 5000 --authkey SECRET
+    python cli.py worker broker-host:5000 --authkey SECRET
+    python cli.py evaluate agent.p --games 10000 --queue broker-host:5000 --authkey SECRET
+    python cli.py dataset data random agent.p --games 100000
+    python cli.py transfer agent.p agent4.p --source-players 2 --target-players 4
+
+Every command imports only the modules it needs, so short jobs start fast
+"""
+import argparse
+import sys
+
+
+def train(args):
+    import pickle
+    import random
+    from agents import QLearningAgent, RandomAgent
+    from evaluation import train as train_agent
+    telemetry = None
+    if args.telemetry is not None:
+        from metrics import LearnerTelemetry
+        telemetry = LearnerTelemetry(args.telemetry, args.telemetry_every)
+    learner = QLearningAgent(0, epsilon=args.epsilon, alpha=args.alpha, gamma=args.gamma, q_values={},
+                             trace_decay=args.trace_decay, telemetry=telemetry)
+    opponents = [RandomAgent(index) for index in range(1, args.players)]
+    if args.bet_cache is not None:
+        from betting import BetEstimator
+        learner.bet_estimator = BetEstimator(path=args.bet_cache, seed=args.seed)
+    try:
+        if args.snapshots is not None:
+            from checkpoint import run_resumable
+            learner = run_resumable(args.snapshots, args.games, learner, opponents, args.seed, args.snapshot_every,
+                                    args.metrics)
+        else:
+            metrics = None
+            if args.metrics is not None:
+                from metrics import MetricsWriter
+                metrics = MetricsWriter(args.metrics)
+            try:
+                train_agent(learner, opponents, args.games, random.Random(args.seed), metrics=metrics)
+            finally:
+                if metrics is not None:
+                    metrics.close()
+    finally:
+        # a resumed run bets with the estimator from its snapshot
+        if learner.bet_estimator is not None:
+            learner.bet_estimator.close()
+    learner.last_state = None
+    learner.bet_estimator = None
+    with open(args.output, "wb") as f:
+        pickle.dump(learner, f)
+    print("Saved", len(learner.q_values), "Q values to", args.output)
+
+
+def evaluate(args):
+    if args.queue is not None:
+        import work_queue
+        broker = work_queue.open_broker(args.queue, encode_authkey(args.authkey))
+        job_ids = work_queue.submit_evaluation(broker, args.agent, args.games, args.batch_size, args.players, args.seed,
+                                               args.early_termination)
+        result = work_queue.combine_evaluations(work_queue.wait_for(broker, job_ids))
+        for name, value in result.items():
+            print(name, value)
+        return
+    import random
+    from agents import RandomAgent
+    import evaluation
+    from tournament import load_entrant
+    agent = load_entrant(args.agent)
+    agent.index = 0
+    agent.hand = []
+    opponents = [RandomAgent(index) for index in range(1, args.players)]
+    if args.bet_cache is not None:
+        from betting import BetEstimator
+        agent.bet_estimator = BetEstimator(path=args.bet_cache, seed=args.seed)
+    try:
+        if args.cache is not None:
+            from result_cache import ResultCache
+            result = evaluation.evaluate_deals(agent, opponents, evaluation.deal_set(args.games, args.seed), args.seed,
+                                               ResultCache(args.cache), args.early_termination)
+        else:
+            result = evaluation.evaluate(agent, opponents, args.games, random.Random(args.seed),
+                                         early_termination=args.early_termination)
+    finally:
+        if agent.bet_estimator is not None:
+            agent.bet_estimator.close()
+    for name, value in result.items():
+        print(name, value)
+
+
+def benchmark(args):
+    if args.transfer:
+        from benchmarks import transfer_games_saved
+        target = .3 if args.target is None else args.target
+        results = transfer_games_saved(target=target, max_games=args.games)
+        print("games to", target, "win rate, warm start:", results["warm"], "from scratch:", results["cold"])
+        return
+    if args.learning:
+        from benchmarks import compare_trace_decay
+        target = .8 if args.target is None else args.target
+        results = compare_trace_decay(target=target, num_players=args.players, max_games=args.games)
+        for trace_decay, episodes in results.items():
+            print("lambda", trace_decay, "games to", target, "win rate:", episodes)
+        return
+    from benchmarks import engine_throughput
+    result = engine_throughput(args.games, args.players, args.seed)
+    print("%d games in %.2fs, %.0f games/s" % (result["games"], result["seconds"], result["games_per_second"]))
+
+
+def tournament(args):
+    from tournament import run_tournament, RANDOM_AGENT
+    specs = args.agents + ([RANDOM_AGENT] if args.random else [])
+    ratings = run_tournament(specs, args.games, args.table_size, args.seed, args.cache, args.processes)[0]
+    for name in sorted(ratings, key=ratings.get, reverse=True):
+        print(round(ratings[name]), name)
+
+
+def encode_authkey(authkey):
+    return authkey.encode() if authkey is not None else None
+
+
+def broker(args):
+    from work_queue import serve_broker
+    print("Serving", args.path, "on port", args.port)
+    serve_broker(args.path, args.authkey.encode(), args.host, args.port, args.lease, args.max_attempts)
+
+
+def worker(args):
+    from work_queue import open_broker, run_worker
+    completed = run_worker(open_broker(args.address, encode_authkey(args.authkey)), args.name,
+                           idle_timeout=args.idle_timeout, blob_dir=args.blob_dir)
+    print("Completed", completed, "jobs")
+
+
+def dataset(args):
+    from dataset import write_dataset
+    written = write_dataset(args.directory, args.agents, args.games, args.processes, args.seed, args.shard_size,
+                            args.compress, args.simple_scoring)
+    print("Wrote", written, "records to", args.directory)
+
+
+def transfer(args):
+    import pickle
+    from transfer import warm_start
+    with open(args.agent, "rb") as f:
+        trained = pickle.load(f)
+    agent = warm_start(trained, args.source_players, args.target_players, trained.index, args.scale,
+                       epsilon=trained.epsilon, alpha=trained.alpha, gamma=trained.discount)
+    with open(args.output, "wb") as f:
+        pickle.dump(agent, f)
+    print("Saved", len(agent.q_values), "Q values for", args.target_players, "players to", args.output)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Spades AI tools")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    train_parser = commands.add_parser("train", help="train a Q learning agent against random agents")
+    train_parser.add_argument("games", type=int)
+    train_parser.add_argument("--output", default="agent.p", help="where to pickle the trained agent")
+    train_parser.add_argument("--players", type=int, default=2)
+    train_parser.add_argument("--epsilon", type=float, default=.1)
+    train_parser.add_argument("--alpha", type=float, default=.4)
+    train_parser.add_argument("--gamma", type=float, default=1)
+    train_parser.add_argument("--trace-decay", type=float, default=0, help="lambda for Q(lambda)")
+    train_parser.add_argument("--metrics", help="CSV file to stream per game metrics to")
+    train_parser.add_argument("--telemetry", help="CSV file to stream Q table lookup and update counters to")
+    train_parser.add_argument("--telemetry-every", type=int, default=100, help="games per telemetry row")
+    train_parser.add_argument("--seed", type=int, default=0)
+    train_parser.add_argument("--snapshots", help="directory to snapshot training to, resumed from if it has one")
+    train_parser.add_argument("--snapshot-every", type=int, default=1000, help="games per snapshot")
+    train_parser.add_argument("--bet-cache", help="file caching Monte Carlo bet estimates, the learner bets with them "
+                                                  "instead of always 13. Saved when training ends")
+    train_parser.set_defaults(handler=train)
+
+    evaluate_parser = commands.add_parser("evaluate", help="play a pickled agent against random agents")
+    evaluate_parser.add_argument("agent", help="pickled agent, or \"random\"")
+    evaluate_parser.add_argument("--games", type=int, default=1000)
+    evaluate_parser.add_argument("--players", type=int, default=2)
+    evaluate_parser.add_argument("--early-termination", action="store_true")
+    evaluate_parser.add_argument("--seed", type=int, default=0)
+    evaluate_parser.add_argument("--cache", help="directory caching game outcomes on a fixed deal set")
+    evaluate_target = evaluate_parser.add_mutually_exclusive_group()
+    evaluate_target.add_argument("--bet-cache", help="file caching Monte Carlo bet estimates, the agent bets with "
+                                                     "them instead of always 13. Saved when evaluation ends")
+    evaluate_target.add_argument("--queue", help="run on workers through a broker, \"host:port\" or SQLite file. "
+                                                 "The checkpoint is sent to the workers through the broker")
+    evaluate_parser.add_argument("--batch-size", type=int, default=100, help="games per queued job")
+    evaluate_parser.add_argument("--authkey", help="the broker's authkey when --queue is \"host:port\"")
+    evaluate_parser.set_defaults(handler=evaluate)
+
+    benchmark_parser = commands.add_parser("benchmark", help="measure engine games per second")
+    benchmark_parser.add_argument("--games", type=int, default=1000)
+    benchmark_parser.add_argument("--players", type=int, default=2)
+    benchmark_parser.add_argument("--seed", type=int, default=0)
+    benchmark_parser.add_argument("--learning", action="store_true",
+                                  help="games Q learning with and without eligibility traces needs to reach --target")
+    benchmark_parser.add_argument("--transfer", action="store_true",
+                                  help="games a 4 player learner warm started from a 2 player table saves to reach "
+                                       "--target")
+    benchmark_parser.add_argument("--target", type=float,
+                                  help="win rate for --learning or --transfer, defaults to .8 and .3")
+    benchmark_parser.set_defaults(handler=benchmark)
+
+    tournament_parser = commands.add_parser("tournament", help="rate pickled agents against each other")
+    tournament_parser.add_argument("agents", nargs="+", help="pickled agents")
+    tournament_parser.add_argument("--games", type=int, default=100)
+    tournament_parser.add_argument("--table-size", type=int, default=2)
+    tournament_parser.add_argument("--no-random", dest="random", action="store_false",
+                                   help="don't enter a random agent")
+    tournament_parser.add_argument("--cache", default="tournaments")
+    tournament_parser.add_argument("--processes", type=int)
+    tournament_parser.add_argument("--seed", type=int, default=0)
+    tournament_parser.set_defaults(handler=tournament)
+
+    broker_parser = commands.add_parser("broker", help="serve a job queue to workers on other hosts")
+    broker_parser.add_argument("path", help="SQLite file holding the jobs")
+    broker_parser.add_argument("--host", default="127.0.0.1", help="interface to listen on, 0.0.0.0 for all")
+    broker_parser.add_argument("--port", type=int, default=5000)
+    broker_parser.add_argument("--lease", type=float, default=60,
+                               help="seconds before a silent worker's job is re-issued")
+    broker_parser.add_argument("--max-attempts", type=int, default=3, help="times a job is tried before it fails")
+    broker_parser.add_argument("--authkey", required=True,
+                               help="secret workers must present. Anyone holding it can run code on this host")
+    broker_parser.set_defaults(handler=broker)
+
+    worker_parser = commands.add_parser("worker", help="run jobs from a broker")
+    worker_parser.add_argument("address", help="\"host:port\" of a broker or its SQLite file")
+    worker_parser.add_argument("--name")
+    worker_parser.add_argument("--blob-dir", help="where checkpoints fetched from the broker are cached")
+    worker_parser.add_argument("--idle-timeout", type=float, help="exit after this many seconds without jobs")
+    worker_parser.add_argument("--authkey", help="the broker's authkey when connecting over TCP")
+    worker_parser.set_defaults(handler=worker)
+
+    dataset_parser = commands.add_parser("dataset", help="write self-play decisions to dataset shards")
+    dataset_parser.add_argument("directory")
+    dataset_parser.add_argument("agents", nargs="+", help="pickled agents or \"random\", one per seat")
+    dataset_parser.add_argument("--games", type=int, default=10000)
+    dataset_parser.add_argument("--processes", type=int, help="producer processes, 0 to play in this process")
+    dataset_parser.add_argument("--shard-size", type=int, default=1000000, help="records per shard")
+    dataset_parser.add_argument("--compress", action="store_true", help="write .npz shards, which can't be mapped")
+    dataset_parser.add_argument("--simple-scoring", action="store_true")
+    dataset_parser.add_argument("--seed", type=int, default=0)
+    dataset_parser.set_defaults(handler=dataset)
+
+    transfer_parser = commands.add_parser("transfer", help="map a Q learning agent to another number of players")
+    transfer_parser.add_argument("agent", help="pickled QLearningAgent")
+    transfer_parser.add_argument("output")
+    transfer_parser.add_argument("--source-players", type=int, default=2)
+    transfer_parser.add_argument("--target-players", type=int, default=4)
+    transfer_parser.add_argument("--scale", type=float, help="Q value factor, defaults to the ratio of hand sizes")
+    transfer_parser.set_defaults(handler=transfer)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,255 @@
+"""
+Self-play datasets of labelled card decisions.
+
+Producer processes play games between any mix of agents and push the decisions of finished games, as arrays of
+RECORD_DTYPE, through a bounded queue. The writer packs them into fixed size shards, .npy files that can be memory
+mapped or compressed .npz files, and lists every shard in index.json. ShardDataset memory maps the shards back for
+training:
+
+    write_dataset("data", ["random", "agent.p"], num_games=100000, processes=8)
+    for batch in ShardDataset("data").iter_batches(4096):
+        batch["hand"], batch["action"], batch["final_tricks"]
+
+Card masks use the card ids of cards.py, board holds the card ids played before the decision in the trick, -1 padded,
+and position is the number of those cards.
+"""
+import json
+import os
+import random
+from bisect import bisect_right
+import numpy as np
+import cards
+from spades import Spades
+
+RECORD_DTYPE = np.dtype([("hand", "<u8"), ("played", "<u8"), ("legal", "<u8"), ("board", "i1", (3,)),
+                         ("position", "i1"), ("trick", "i1"), ("bet", "i1"), ("tricks_won", "i1"),
+                         ("num_players", "i1"), ("action", "i1"), ("final_tricks", "i1"), ("final_score", "<i2")])
+INDEX_FILE = "index.json"
+
+
+class RecordingSpades(Spades):
+    """
+    Spades game that records every card placed with what the player could see when choosing it, so any agent,
+    including the learning ones played through play_turn, can produce records
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.decisions = []
+
+    def place_card(self, card, player, index):
+        observation = self.observe(player)
+        board = [cards.card_id(board_card) for board_card in observation.board]
+        self.decisions.append((player.index, cards.cards_to_mask(observation.hand), observation.played_mask,
+                               cards.cards_to_mask(self.get_legal_moves(player)), board + [-1] * (3 - len(board)),
+                               index, observation.trick_index, observation.bet, observation.tricks_won,
+                               cards.card_id(card)))
+        super().place_card(card, player, index)
+
+    def records(self):
+        """
+        :return: array of RECORD_DTYPE of the finished game's decisions labelled with its final tricks and scores
+        """
+        records = np.empty(len(self.decisions), RECORD_DTYPE)
+        num_players = len(self.players)
+        for row, (player_index, hand, played, legal, board, position, trick, bet, tricks_won, action) in \
+                enumerate(self.decisions):
+            records[row] = (hand, played, legal, board, position, trick, bet, tricks_won, num_players, action,
+                            self.scores[player_index], self.final_scores[player_index])
+        return records
+
+
+def play_records(agents, num_games, rng, simple_scoring=False, games_per_chunk=64):
+    """
+    Play num_games games with shuffled seating and seeded deals
+    :return: generator of record arrays, one per games_per_chunk games
+    """
+    chunk = []
+    for game_number in range(num_games):
+        playing_order = list(agents)
+        rng.shuffle(playing_order)
+        game = RecordingSpades(playing_order, simple_scoring=simple_scoring, deal_seed=rng.randrange(2 ** 32))
+        game.play_spades()
+        chunk.append(game.records())
+        if len(chunk) == games_per_chunk:
+            yield np.concatenate(chunk)
+            chunk = []
+    if chunk:
+        yield np.concatenate(chunk)
+
+
+def load_agents(specs):
+    from tournament import load_entrant
+    agents = [load_entrant(spec) for spec in specs]
+    for index, agent in enumerate(agents):
+        agent.index = index
+        agent.hand = []
+    return agents
+
+
+def produce(specs, num_games, seed, simple_scoring, queue):
+    """
+    Producer process: play games and put their records on queue, then None once done
+    """
+    random.seed(seed)
+    try:
+        for chunk in play_records(load_agents(specs), num_games, random.Random(seed), simple_scoring):
+            queue.put(chunk)
+    finally:
+        queue.put(None)
+
+
+class ShardWriter:
+    """
+    Packs record arrays into shards of shard_size records. Shards are written to a temporary file and renamed, and
+    index.json is rewritten after each one, so an interrupted run leaves a readable dataset. Writing into a directory
+    that already holds a dataset appends to it
+    """
+
+    def __init__(self, directory, shard_size=1000000, compress=False):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+        self.index = read_index(directory) or {"dtype": RECORD_DTYPE.descr, "shards": []}
+        self.buffer = np.empty(shard_size, RECORD_DTYPE)
+        self.filled = 0
+
+    def write(self, records):
+        start = 0
+        while start < len(records):
+            count = min(len(records) - start, self.shard_size - self.filled)
+            self.buffer[self.filled:self.filled + count] = records[start:start + count]
+            self.filled += count
+            start += count
+            if self.filled == self.shard_size:
+                self.flush()
+
+    def flush(self):
+        if not self.filled:
+            return
+        file_name = "shard-%05d.%s" % (len(self.index["shards"]), "npz" if self.compress else "npy")
+        path = os.path.join(self.directory, file_name)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            if self.compress:
+                np.savez_compressed(f, records=self.buffer[:self.filled])
+            else:
+                np.save(f, self.buffer[:self.filled])
+        os.replace(temp_path, path)
+        self.index["shards"].append({"file": file_name, "records": self.filled})
+        write_index(self.directory, self.index)
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_index(directory, index):
+    path = os.path.join(directory, INDEX_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_dataset(directory, specs, num_games, processes=None, seed=0, shard_size=1000000, compress=False,
+                  simple_scoring=False, queue_size=64):
+    """
+    :param specs: seats of every game, checkpoint paths or "random" as for tournament.load_entrant
+    :param processes: producer processes, defaults to the number of CPUs. 0 plays in this process
+    :param queue_size: chunks of records waiting for the writer before producers block
+    :return: number of records written
+    """
+    written = 0
+    with ShardWriter(directory, shard_size, compress) as writer:
+        if processes == 0:
+            for chunk in play_records(load_agents(specs), num_games, random.Random(seed), simple_scoring):
+                writer.write(chunk)
+                written += len(chunk)
+            return written
+        import multiprocessing
+        processes = processes or os.cpu_count()
+        queue = multiprocessing.Queue(queue_size)
+        producers = []
+        for worker in range(processes):
+            worker_games = num_games // processes + (worker < num_games % processes)
+            producer = multiprocessing.Process(target=produce, daemon=True,
+                                               args=(specs, worker_games, seed * 1000003 + worker, simple_scoring,
+                                                     queue))
+            producer.start()
+            producers.append(producer)
+        running = processes
+        while running:
+            chunk = queue.get()
+            if chunk is None:
+                running -= 1
+            else:
+                writer.write(chunk)
+                written += len(chunk)
+        for producer in producers:
+            producer.join()
+            if producer.exitcode:
+                raise RuntimeError("Producer exited with code %d" % producer.exitcode)
+    return written
+
+
+class ShardDataset:
+    """
+    Records of a dataset directory. .npy shards are memory mapped, so only the records read are loaded
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        index = read_index(directory)
+        if index is None:
+            raise FileNotFoundError("No " + INDEX_FILE + " in " + directory)
+        self.shards = []
+        self.offsets = []
+        total = 0
+        for shard in index["shards"]:
+            path = os.path.join(directory, shard["file"])
+            if path.endswith(".npz"):
+                with np.load(path) as data:
+                    records = data["records"]
+            else:
+                records = np.load(path, mmap_mode="r")
+            self.offsets.append(total)
+            self.shards.append(records)
+            total += shard["records"]
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.total:
+            raise IndexError(position)
+        shard = bisect_right(self.offsets, position) - 1
+        return self.shards[shard][position - self.offsets[shard]]
+
+    def iter_batches(self, batch_size, shuffle_shards=False, rng=None):
+        """
+        :param shuffle_shards: visit shards in random order, records within a shard stay in order
+        :return: generator of record arrays of at most batch_size records, views into the shards where possible
+        """
+        order = list(range(len(self.shards)))
+        if shuffle_shards:
+            (rng or random).shuffle(order)
+        for shard in order:
+            records = self.shards[shard]
+            for start in range(0, len(records), batch_size):
+                yield records[start:start + batch_size]
@@ -0,0 +1,133 @@
+"""
+Quiet training and evaluation loops, used by tools that run many games without play_x_games' score board printing
+"""
+import random
+from spades import Spades
+
+
+def train(learner, opponents, num_games, rng, metrics=None):
+    """
+    Play num_games training games with the seating order shuffled and a fresh deal each game
+    :param learner: agent being trained, any agent works
+    :param opponents: list of agents it plays against
+    :param rng: random.Random drawing the seating orders and deal seeds
+    :param metrics: optional metrics.MetricsWriter recording every game
+    """
+    players = [learner] + list(opponents)
+    for game_number in range(num_games):
+        playing_order = list(players)
+        rng.shuffle(playing_order)
+        game = Spades(playing_order, deal_seed=rng.randrange(2 ** 32))
+        game.play_spades()
+        if metrics is not None:
+            metrics.record_game(game)
+
+
+def play_game(players, deal_seed=None, early_termination=False):
+    """
+    Play one game under simple scoring, so final scores rank players by tricks taken
+    :param early_termination: stop once the winner is decided, tricks taken then only count the tricks played
+    :return: the finished Spades game
+    """
+    game = Spades(list(players), simple_scoring=True, deal_seed=deal_seed, early_termination=early_termination)
+    game.play_spades()
+    return game
+
+
+def winners(game):
+    """
+    :return: list of indexes of the players with the highest final score
+    """
+    best_score = max(game.final_scores.values())
+    return [index for index, score in game.final_scores.items() if score == best_score]
+
+
+def evaluate(agent, opponents, num_games, rng, early_termination=False):
+    """
+    Play agent against opponents with shuffled seating and deals. Ties for the most tricks split the win
+    :param early_termination: stop games once decided, see play_game
+    :return: dict with games, wins, win_rate and mean_tricks for agent
+    """
+    players = [agent] + list(opponents)
+    wins = 0.0
+    tricks = 0
+    for game_number in range(num_games):
+        playing_order = list(players)
+        rng.shuffle(playing_order)
+        game = play_game(playing_order, deal_seed=rng.randrange(2 ** 32), early_termination=early_termination)
+        game_winners = winners(game)
+        if agent.index in game_winners:
+            wins += 1 / len(game_winners)
+        tricks += game.scores[agent.index]
+    return {"games": num_games, "wins": wins, "win_rate": wins / num_games, "mean_tricks": tricks / num_games}
+
+
+def deal_set(num_games, seed=0):
+    """
+    :return: list of num_games deal ids, i.e. deal seeds, the same for the same seed
+    """
+    rng = random.Random(seed)
+    return [rng.randrange(2 ** 32) for game_number in range(num_games)]
+
+
+def play_deal(players, deal_id, seed, early_termination=False):
+    """
+    Play deal_id with the seating and every agent's random choices drawn from deal_id and seed alone, so deterministic
+    agents play the same game whatever was played before. The global random module and the agents' own generators
+    are put back afterwards, so a training loop around the evaluation draws the same numbers as without it
+    :return: the finished Spades game
+    """
+    game_seed = "%d-%d" % (deal_id, seed)
+    rng = random.Random(game_seed)
+    playing_order = list(players)
+    rng.shuffle(playing_order)
+    global_state = random.getstate()
+    agent_states = []
+    random.seed(game_seed)
+    for player in players:
+        if isinstance(getattr(player, "random", None), random.Random):
+            agent_states.append((player.random, player.random.getstate()))
+            player.random.seed(game_seed)
+    try:
+        return play_game(playing_order, deal_seed=deal_id, early_termination=early_termination)
+    finally:
+        random.setstate(global_state)
+        for agent_random, state in agent_states:
+            agent_random.setstate(state)
+
+
+def evaluate_deals(agent, opponents, deals, seed=0, cache=None, early_termination=False):
+    """
+    evaluate over a fixed set of deals, reusing cached game outcomes. A game is cached under its deal id, seed and the
+    fingerprint of every agent, see Agent.fingerprint, and only if all of them have one
+    :param deals: deal ids, e.g. from deal_set
+    :param cache: result_cache.ResultCache, None to play every game
+    :return: the same dict as evaluate with the number of games served from the cache as cached
+    """
+    from result_cache import hash_key, code_version
+    players = [agent] + list(opponents)
+    fingerprints = [player.fingerprint() for player in players]
+    if cache is not None and None in fingerprints:
+        cache = None
+    wins = 0.0
+    tricks = 0
+    cached = 0
+    for deal_id in deals:
+        outcome = None
+        if cache is not None:
+            key = hash_key("game", deal_id, seed, fingerprints, early_termination, code_version())
+            outcome = cache.get(key)
+        if outcome is not None:
+            cached += 1
+        else:
+            game = play_deal(players, deal_id, seed, early_termination)
+            game_winners = winners(game)
+            share = 1 / len(game_winners) if agent.index in game_winners else 0.0
+            outcome = {"wins": share, "tricks": game.scores[agent.index]}
+            if cache is not None:
+                cache.put(key, outcome)
+        wins += outcome["wins"]
+        tricks += outcome["tricks"]
+    num_games = len(deals)
+    return {"games": num_games, "wins": wins, "win_rate": wins / num_games, "mean_tricks": tricks / num_games,
+            "cached": cached}
@@ -0,0 +1,159 @@
+"""
+Structured log of game events written as JSON lines. Events are buffered and written in batches, and Spades only
+builds an event when the log's level asks for it, so a game without a log or with a low level pays almost nothing.
+
+Levels:
+    GAME: deal, bet and score events, one set per game
+    TRICK: also trick won events
+    PLAY: also every card played, which is what replay needs to rebuild a game
+"""
+import json
+import os
+import cards
+from agents import Agent
+
+OFF = 0
+GAME = 1
+TRICK = 2
+PLAY = 3
+
+
+class EventLog:
+
+    def __init__(self, path, level=PLAY, buffer_size=10000):
+        """
+        :param path: JSONL file, appended to with game ids following on from the ones already in it
+        :param level: highest level of event recorded
+        :param buffer_size: events held in memory before a batch is written
+        """
+        self.path = path
+        self.level = level
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.games_started = EventLog.next_game_id(path)
+        self.file = open(path, "a")
+
+    @staticmethod
+    def next_game_id(path):
+        """
+        Continue the game ids of an existing log, reading only its end
+        """
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            last_line = f.read().decode("utf-8").strip().splitlines()[-1]
+        return json.loads(last_line)["game"] + 1
+
+    def new_game(self):
+        """
+        :return: id for the next game's events, unique within this log
+        """
+        game_id = self.games_started
+        self.games_started += 1
+        return game_id
+
+    def emit(self, event):
+        """
+        :param event: dict with at least "game" and "event" keys
+        """
+        self.buffer.append(event)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("".join(json.dumps(event) + "\n" for event in self.buffer))
+            self.file.flush()
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_events(path, game_id=None):
+    """
+    :return: generator of events in the order they were logged, only those of game_id if given
+    """
+    with open(path) as f:
+        for line in f:
+            event = json.loads(line)
+            if game_id is None or event["game"] == game_id:
+                yield event
+
+
+class ScriptedAgent(Agent):
+    """
+    Agent replaying the bet and cards a player made in a logged game
+    """
+
+    def __init__(self, index, bet, plays):
+        """
+        :param plays: card ids in the order the player played them
+        """
+        Agent.__init__(self, index=index)
+        self.bet = bet
+        self.plays = list(reversed(plays))
+
+    def make_bet(self, state, num_players=2):
+        return self.bet
+
+    def getAction(self, state):
+        card_id = self.plays.pop()
+        for card in self.hand:
+            if cards.card_id(card) == card_id:
+                return card
+        raise ValueError("Logged card " + str(card_id) + " is not in player " + str(self.index) + "'s hand")
+
+
+def replay(path, game_id):
+    """
+    Rebuild a game from a log recorded at PLAY level by dealing the logged hands and replaying the logged bets
+    and cards through the engine
+    :return: the replayed Spades game, its scores match the logged game's
+    """
+    from spades import Spades
+    deal = None
+    bets = {}
+    plays = {}
+    for event in read_events(path, game_id):
+        if event["event"] == "deal":
+            deal = event
+        elif event["event"] == "bet":
+            bets[event["player"]] = event["bet"]
+        elif event["event"] == "play":
+            plays.setdefault(event["player"], []).append(event["card"])
+    if deal is None:
+        raise ValueError("No deal logged for game " + str(game_id))
+    players = []
+    for index, hand in deal["hands"]:
+        player = ScriptedAgent(index, bets[index], plays.get(index, []))
+        player.hand = [cards.card_from_id(card_id) for card_id in hand]
+        players.append(player)
+    game = Spades(players, simple_scoring=deal["simple_scoring"], early_termination=deal["early_termination"])
+    game.place_bets()
+    while not game.terminal_test():
+        game.play_turn()
+        if game.early_termination and game.outcome_decided():
+            game.stop_early()
+    game.score_game()
+    return game
+
+
+def verify_replay(path, game_id):
+    """
+    :return: True if replaying game_id reproduces the logged final scores
+    """
+    game = replay(path, game_id)
+    for event in read_events(path, game_id):
+        if event["event"] == "score":
+            return [[index, score] for index, score in game.final_scores.items()] == event["final_scores"]
+    raise ValueError("No score logged for game " + str(game_id))
@@ -0,0 +1,340 @@
+"""
+Information set Monte Carlo tree search (single observer ISMCTS) for playing cards.
+
+Every iteration deals the cards the agent can't see at random to the other players, consistent with how many cards
+each holds and the suits they are known to be void in, then walks the tree with the moves that are legal in that
+deal. Children are selected by UCB1 using the number of times they were available rather than their parent's visits,
+and the deal is played out at random to the end of the game. Values are win shares from the point of view of the
+player making each move, so the same search works for any number of players.
+
+Nodes live in a preallocated NodePool of flat arrays indexed by node number, and the subtree of the moves actually
+played is kept for the agent's next decision, so a search allocates no per node objects.
+"""
+import math
+import random
+import time
+from array import array
+import cards
+from agents import RandomAgent
+
+NO_NODE = -1
+
+
+class NodePool:
+    """
+    Fixed capacity tree. Children of a node are a linked list through first_child and next_sibling, card is the card id
+    played to reach the node and seat the seat that played it. Released nodes go on a free list for reuse
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.card = array("b", [0]) * capacity
+        self.seat = array("b", [0]) * capacity
+        self.first_child = array("l", [NO_NODE]) * capacity
+        self.next_sibling = array("l", [NO_NODE]) * capacity
+        self.visits = array("l", [0]) * capacity
+        self.available = array("l", [0]) * capacity
+        self.value = array("d", [0.0]) * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.stack = []
+
+    def in_use(self) -> int:
+        return self.capacity - len(self.free)
+
+    def allocate(self, card=0, seat=0, parent=NO_NODE):
+        """
+        :return: index of a cleared node linked under parent, NO_NODE if the pool is full
+        """
+        if not self.free:
+            return NO_NODE
+        node = self.free.pop()
+        self.card[node] = card
+        self.seat[node] = seat
+        self.first_child[node] = NO_NODE
+        self.visits[node] = 0
+        self.available[node] = 0
+        self.value[node] = 0.0
+        if parent != NO_NODE:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = NO_NODE
+        return node
+
+    def find_child(self, node, card):
+        child = self.first_child[node]
+        while child != NO_NODE and self.card[child] != card:
+            child = self.next_sibling[child]
+        return child
+
+    def release(self, root, keep=NO_NODE):
+        """
+        Free root and everything below it except the subtree under keep
+        """
+        stack = self.stack
+        stack.append(root)
+        while stack:
+            node = stack.pop()
+            if node == keep:
+                continue
+            child = self.first_child[node]
+            while child != NO_NODE:
+                stack.append(child)
+                child = self.next_sibling[child]
+            self.free.append(node)
+        if keep != NO_NODE:
+            self.next_sibling[keep] = NO_NODE
+
+    def advance(self, root, played):
+        """
+        Move the root down the cards played since it was searched, freeing the rest of the tree
+        :param played: card ids in play order
+        :return: the new root, NO_NODE if a card was never expanded, in which case the whole tree is freed
+        """
+        node = root
+        for card in played:
+            node = self.find_child(node, card)
+            if node == NO_NODE:
+                break
+        self.release(root, keep=node)
+        return node
+
+
+class Determinization:
+    """
+    Mutable game state on card id bitmasks, reset from the real game before every iteration. Seats are positions in
+    game.players
+    """
+
+    def __init__(self, num_players):
+        self.num_players = num_players
+        self.hands = [0] * num_players
+        self.tricks = [0] * num_players
+        self.trick = []
+        self.leader = 0
+        self.to_move = 0
+        self.lead_suit = cards.NO_LEAD
+
+    def reset(self, hands, tricks, trick, leader):
+        self.hands[:] = hands
+        self.tricks[:] = tricks
+        self.trick[:] = trick
+        self.leader = leader
+        self.to_move = (leader + len(trick)) % self.num_players
+        self.lead_suit = trick[0] // 13 if trick else cards.NO_LEAD
+
+    def terminal(self) -> bool:
+        return not self.hands[self.to_move]
+
+    def legal_mask(self):
+        return cards.legal_mask(self.hands[self.to_move], self.lead_suit)
+
+    def play(self, card):
+        self.hands[self.to_move] &= ~(1 << card)
+        trick = self.trick
+        if not trick:
+            self.lead_suit = card // 13
+        trick.append(card)
+        if len(trick) < self.num_players:
+            self.to_move = (self.to_move + 1) % self.num_players
+            return
+        winner = (self.leader + cards.trick_winner(trick)) % self.num_players
+        self.tricks[winner] += 1
+        self.leader = self.to_move = winner
+        self.lead_suit = cards.NO_LEAD
+        trick.clear()
+
+
+def random_bit(mask, rng):
+    """
+    :return: index of a uniformly chosen set bit of mask
+    """
+    skip = rng.randrange(bin(mask).count("1"))
+    for _ in range(skip):
+        mask &= mask - 1
+    return (mask & -mask).bit_length() - 1
+
+
+class ISMCTSAgent(RandomAgent):
+    """
+    Plays the card with the most visits after searching for iterations iterations or time_limit seconds, whichever
+    comes first, but always at least one iteration. Bets like RandomAgent
+    """
+
+    def __init__(self, index=0, iterations=1000, time_limit=None, exploration=0.7, capacity=100000, seed=None):
+        """
+        :param time_limit: seconds per decision, None to only use the iteration budget
+        :param exploration: UCB1 exploration constant
+        :param capacity: number of nodes in the pool. Once full the search stops expanding and only plays out
+        :param seed: seed for the deals and play outs
+        """
+        super().__init__(index)
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.pool = NodePool(capacity)
+        self.random = random.Random(seed)
+        self.root = NO_NODE
+        self.played = None
+        self.history_length = 0
+        self.state = None
+        self.path = []
+
+    def start_episode(self):
+        self.reset_tree()
+
+    def fingerprint(self):
+        if self.time_limit is not None or self.bet_estimator is not None:
+            return None
+        return "ISMCTSAgent-%d-%r-%d" % (self.iterations, self.exploration, self.pool.capacity)
+
+    def reset_tree(self):
+        if self.root != NO_NODE:
+            self.pool.release(self.root)
+        self.root = NO_NODE
+
+    def getAction(self, state):
+        game = state
+        played = game.played
+        if played is not self.played:
+            self.reset_tree()
+            self.played = played
+        elif self.root != NO_NODE:
+            self.root = self.pool.advance(self.root, played.history[self.history_length:])
+        self.history_length = len(played.history)
+        if self.root == NO_NODE:
+            self.root = self.pool.allocate()
+            if self.root == NO_NODE:
+                self.reset_tree()
+                self.root = self.pool.allocate()
+        self.search(game)
+        card_id = self.best_card()
+        if card_id is None:
+            card_id = cards.card_id(self.random.choice(game.get_legal_moves(self)))
+        self.root = self.pool.advance(self.root, (card_id,))
+        self.history_length += 1
+        for card in self.hand:
+            if cards.card_id(card) == card_id:
+                return card
+
+    def best_card(self):
+        """
+        :return: card id of the most visited child of the root, None if the pool had no room for any
+        """
+        pool = self.pool
+        best = NO_NODE
+        child = pool.first_child[self.root]
+        while child != NO_NODE:
+            if best == NO_NODE or pool.visits[child] > pool.visits[best]:
+                best = child
+            child = pool.next_sibling[child]
+        return pool.card[best] if best != NO_NODE else None
+
+    def search(self, game):
+        players = game.players
+        num_players = len(players)
+        if self.state is None or self.state.num_players != num_players:
+            self.state = Determinization(num_players)
+        seat = game.seats.seat_of[self.index]
+        hand = cards.cards_to_mask(self.hand)
+        unseen = game.played.unseen_mask(self.hand)
+        counts = [len(player.hand) for player in players]
+        voids = [game.played.voids[player.index] for player in players]
+        tricks = [game.scores[player.index] for player in players]
+        bets = [game.bets[player.index] for player in players]
+        trick = [cards.card_id(game.board[position]) for position in range(len(game.board))]
+        leader = game.leader_seat
+        hands = [0] * num_players
+        order = sorted(range(num_players), key=lambda other: -bin(voids[other]).count("1"))
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        for iteration in range(max(1, self.iterations)):
+            if iteration and deadline is not None and time.perf_counter() > deadline:
+                break
+            self.deal(hands, order, seat, hand, unseen, counts, voids)
+            self.state.reset(hands, tricks, trick, leader)
+            self.iterate(game, bets)
+
+    def deal(self, hands, order, seat, hand, unseen, counts, voids):
+        """
+        Fill hands with a random deal of the unseen cards, giving each seat its card count and, where possible, no
+        cards of suits it is known to be void in
+        :param order: seats to deal to, the ones void in the most suits first
+        """
+        rng = self.random
+        for attempt in range(10):
+            remaining = unseen
+            dealt = True
+            for other in order:
+                if other == seat:
+                    hands[other] = hand
+                    continue
+                allowed = remaining & ~cards.SUIT_MASKS[voids[other]] if attempt < 9 else remaining
+                if bin(allowed).count("1") < counts[other]:
+                    dealt = False
+                    break
+                dealt_hand = 0
+                for _ in range(counts[other]):
+                    card = 1 << random_bit(allowed, rng)
+                    allowed ^= card
+                    dealt_hand |= card
+                remaining &= ~dealt_hand
+                hands[other] = dealt_hand
+            if dealt:
+                return
+
+    def iterate(self, game, bets):
+        pool = self.pool
+        state = self.state
+        rng = self.random
+        path = self.path
+        path.clear()
+        node = self.root
+        while not state.terminal():
+            legal = state.legal_mask()
+            tried = 0
+            child = pool.first_child[node]
+            while child != NO_NODE:
+                if legal >> pool.card[child] & 1:
+                    pool.available[child] += 1
+                    tried |= 1 << pool.card[child]
+                child = pool.next_sibling[child]
+            untried = legal & ~tried
+            if untried:
+                card = random_bit(untried, rng)
+                node = pool.allocate(card, state.to_move, node)
+                state.play(card)
+                if node != NO_NODE:
+                    path.append(node)
+                break
+            node = self.select(node, legal)
+            state.play(pool.card[node])
+            path.append(node)
+        while not state.terminal():
+            state.play(random_bit(state.legal_mask(), rng))
+        scores = [game.final_score(bets[seat], state.tricks[seat]) for seat in range(state.num_players)]
+        best = max(scores)
+        winners = scores.count(best)
+        pool.visits[self.root] += 1
+        for node in path:
+            pool.visits[node] += 1
+            if scores[pool.seat[node]] == best:
+                pool.value[node] += 1 / winners
+
+    def select(self, node, legal):
+        """
+        :return: legal child with the highest UCB1 score
+        """
+        pool = self.pool
+        best = NO_NODE
+        best_score = -1.0
+        child = pool.first_child[node]
+        while child != NO_NODE:
+            if legal >> pool.card[child] & 1:
+                visits = pool.visits[child]
+                score = pool.value[child] / visits + \
+                    self.exploration * math.sqrt(math.log(pool.available[child]) / visits)
+                if score > best_score:
+                    best = child
+                    best_score = score
+            child = pool.next_sibling[child]
+        return best
@@ -0,0 +1,277 @@
+"""
+Streaming per episode training metrics. MetricsWriter appends one CSV row per player per game in buffered chunks, and
+the reader functions stream the file back computing rolling means and downsampled curves in constant memory, so
+training curves can be plotted without unpickling an agent and its Q table
+"""
+import csv
+import os
+from collections import deque
+
+FIELDS = ["episode", "player", "reward", "won", "tricks", "bet", "final_score"]
+NUMERIC_FIELDS = {"episode": int, "reward": float, "won": int, "tricks": int, "bet": int, "final_score": int}
+
+
+class MetricsWriter:
+
+    def __init__(self, path, chunk_size=1000):
+        """
+        :param path: CSV file, appended to if it already exists so resumed runs continue the same file
+        :param chunk_size: rows buffered before they are written
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.episode = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            last_line = MetricsWriter.last_line(path)
+            if not last_line.startswith(FIELDS[0]):
+                self.episode = int(last_line.split(",")[0]) + 1
+        else:
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerow(FIELDS)
+
+    @staticmethod
+    def last_line(path):
+        """
+        Read only the end of the file, so resuming doesn't scan a long run's metrics
+        """
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            return f.read().decode("utf-8").strip().splitlines()[-1]
+
+    def record_game(self, game):
+        """
+        Add a row for every player of a finished Spades game
+        """
+        best_score = max(game.final_scores.values())
+        for player in game.players:
+            reward = getattr(player, "reward_this_episode", 0)
+            final_score = game.final_scores[player.index]
+            self.rows.append((self.episode, player.index, reward, int(final_score == best_score),
+                              game.scores[player.index], game.bets[player.index], final_score))
+        self.episode += 1
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with open(self.path, "a", newline="") as f:
+                csv.writer(f).writerows(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_rows(path, player=None):
+    """
+    Stream the rows of a metrics file
+    :param player: only rows for this player index if given
+    :return: generator of dicts, numeric fields converted
+    """
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if player is not None and row["player"] != str(player):
+                continue
+            for field, convert in NUMERIC_FIELDS.items():
+                row[field] = convert(row[field])
+            yield row
+
+
+def iter_field(path, field="reward", player=None):
+    """
+    Stream a single field of a metrics file. Rows are split with a plain csv.reader and only the episode and field
+    are converted, which is several times faster than iter_rows on long runs
+    :return: generator of (episode, value)
+    """
+    convert = NUMERIC_FIELDS[field]
+    player = None if player is None else str(player)
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        column = header.index(field)
+        player_column = header.index("player")
+        for row in reader:
+            if player is None or row[player_column] == player:
+                yield int(row[0]), convert(row[column])
+
+
+def rolling_mean(path, field="reward", window=1000, player=None, every=1):
+    """
+    :param every: only yield every nth point, to downsample long runs
+    :return: generator of (episode, mean of field over the last window rows)
+    """
+    values = deque()
+    total = 0.0
+    for count, (episode, value) in enumerate(iter_field(path, field, player)):
+        values.append(value)
+        total += value
+        if len(values) > window:
+            total -= values.popleft()
+        if count % every == 0:
+            yield episode, total / len(values)
+
+
+def downsample(path, field="reward", bucket=1000, player=None):
+    """
+    :return: list of (first episode of bucket, mean of field over the bucket) for consecutive buckets of rows
+    """
+    points = []
+    total = 0.0
+    count = 0
+    first_episode = None
+    for episode, value in iter_field(path, field, player):
+        if first_episode is None:
+            first_episode = episode
+        total += value
+        count += 1
+        if count == bucket:
+            points.append((first_episode, total / count))
+            total = 0.0
+            count = 0
+            first_episode = None
+    if count:
+        points.append((first_episode, total / count))
+    return points
+
+
+def plot_every(path, player=None, max_points=2000):
+    """
+    Downsampling step for rolling_mean keeping about max_points points. The row count is worked out from the episode
+    of the last row and the players of the first game instead of reading the whole file
+    """
+    last_line = MetricsWriter.last_line(path)
+    if last_line.startswith(FIELDS[0]):
+        return 1
+    rows = int(last_line.split(",")[0]) + 1
+    if player is None:
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            first_row = next(reader)
+            players = 1
+            for row in reader:
+                if row[0] != first_row[0]:
+                    break
+                players += 1
+        rows *= players
+    return max(1, rows // max_points)
+
+
+def plot_rolling_mean(path, field="reward", window=1000, player=None, max_points=2000):
+    import matplotlib.pyplot as plt
+    every = plot_every(path, player, max_points)
+    points = list(rolling_mean(path, field, window, player, every))
+    plt.plot([point[0] for point in points], [point[1] for point in points])
+    plt.xlabel("Number of training games")
+    plt.ylabel("Average " + field + " over last " + str(window) + " games")
+    plt.show()
+
+
+TELEMETRY_FIELDS = ["episode", "player", "lookups", "hit_rate", "states_seen", "q_entries", "explored", "exploited",
+                    "updates", "mean_abs_td_error"]
+
+
+class LearnerTelemetry:
+    """
+    Counters for a learning QLearningAgent, passed to it as telemetry. Q value lookups (one per legal action of each
+    decision the agent makes), exploration, actions and TD errors are counted over a window of `every` episodes. At
+    the end of each window they are written as one row of a CSV file and reset. States seen are counted over the whole
+    run. Each update is an integer or float addition, so training is barely slowed.
+    Setting rows to a list holds the rows there instead of writing them, see checkpoint.run_resumable
+    """
+    rows = None
+
+    def __init__(self, path, every=100):
+        """
+        :param path: CSV file, appended to if it already exists
+        :param every: episodes per row
+        """
+        self.path = path
+        self.every = every
+        self.episode = 0
+        self.state_visits = {}
+        self.action_names = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            last_line = MetricsWriter.last_line(path)
+            if not last_line.startswith(TELEMETRY_FIELDS[0]):
+                self.episode = int(last_line.split(",")[0])
+            with open(path, newline="") as f:
+                self.action_names = next(csv.reader(f))[len(TELEMETRY_FIELDS):]
+        self.reset_window()
+
+    def reset_window(self):
+        self.hits = 0
+        self.misses = 0
+        self.explored = 0
+        self.exploited = 0
+        self.updates = 0
+        self.abs_td_error = 0.0
+        self.actions = {}
+
+    def record_lookups(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+    def record_action(self, action, explored):
+        if explored:
+            self.explored += 1
+        else:
+            self.exploited += 1
+        self.actions[action] = self.actions.get(action, 0) + 1
+
+    def record_state(self, state_key):
+        self.state_visits[state_key] = self.state_visits.get(state_key, 0) + 1
+
+    def record_update(self, td_error):
+        self.updates += 1
+        self.abs_td_error += abs(td_error)
+
+    def top_states(self, count=10):
+        """
+        :return: list of (state key, visits) of the most visited states
+        """
+        return sorted(self.state_visits.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def end_episode(self, agent):
+        self.episode += 1
+        if self.episode % self.every == 0:
+            self.sample(agent)
+
+    def sample(self, agent):
+        """
+        Write a row for the current window and start a new one
+        """
+        if self.action_names is None:
+            self.action_names = sorted(agent.reward_multipliers)
+            with open(self.path, "w", newline="") as f:
+                csv.writer(f).writerow(TELEMETRY_FIELDS + self.action_names)
+        lookups = self.hits + self.misses
+        row = [self.episode, agent.index, lookups, self.hits / lookups if lookups else 0.0, len(self.state_visits),
+               len(agent.q_values), self.explored, self.exploited, self.updates,
+               self.abs_td_error / self.updates if self.updates else 0.0]
+        row += [self.actions.get(action, 0) for action in self.action_names]
+        if self.rows is not None:
+            self.rows.append(row)
+        else:
+            with open(self.path, "a", newline="") as f:
+                csv.writer(f).writerow(row)
+        self.reset_window()
+
+
+def iter_telemetry(path):
+    """
+    Stream the rows of a telemetry file, every field converted to a number
+    :return: generator of dicts
+    """
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield {field: float(value) if field in ("hit_rate", "mean_abs_td_error") else int(value)
+                   for field, value in row.items()}
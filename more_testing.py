@@ -9,9 +9,8 @@ agent_25k = pickle.load(open("agentdata/X2QLAGENT_GAMES_250007-20-50-0.p", "rb")
 agent_10k = pickle.load(open("agentdata/QLAGENT_GAMES_100007-21-1-43.p", "rb"))
 
 if __name__ == "__main__":
-    ql = agents.QLearningAgent("test", epsilon=0)
-    agent_10k.epsilon = 0
-    players = [agent_10k, agents.RandomAgent(2)]
+    frozen_10k = agents.FrozenQAgent.from_agent(agent_10k)
+    players = [frozen_10k, agents.RandomAgent(2)]
     run_x_games_and_pickle(players, 2000)
 
 
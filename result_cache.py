@@ -0,0 +1,68 @@
+"""
+On disk cache of JSON results, keyed by a hash of whatever determines the result
+"""
+import hashlib
+import json
+import os
+
+ENGINE_FILES = ["spades.py", "agents.py", "cards.py", "evaluation.py", "ismcts.py", "cfr.py"]
+_code_versions = {}
+
+
+def hash_key(*parts):
+    """
+    :param parts: JSON serialisable values, dict key order doesn't matter
+    :return: hex digest identifying parts
+    """
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def code_version(*extra_files):
+    """
+    :param extra_files: sources of the caller that also decide its results, e.g. "sweep.py"
+    :return: hash of the engine and agent sources and extra_files, so cached results are not reused once the rules,
+        the agents or the code producing the results change
+    """
+    if extra_files not in _code_versions:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for file_name in ENGINE_FILES + list(extra_files):
+            with open(os.path.join(directory, file_name), "rb") as f:
+                digest.update(f.read())
+        _code_versions[extra_files] = digest.hexdigest()
+    return _code_versions[extra_files]
+
+
+class ResultCache:
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        :return: the cached value, or None if key hasn't been stored
+        """
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        """
+        Store value under key. Writes a temporary file then renames it, so a crash never leaves a partial entry
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(temp_path, path)
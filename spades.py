@@ -1,18 +1,174 @@
-import pyCardDeck
 from typing import List
 from agents import Agent, RandomAgent, QLearningAgent
 import random
+import cards
+import events
+from collections import namedtuple
 from copy import deepcopy, copy
+
+# seat is the player's position in the players list as in SeatModel, not its position in the current trick
+DecisionPoint = namedtuple("DecisionPoint", ["player", "seat", "legal_moves", "observation"])
+Observation = namedtuple("Observation", ["hand", "board", "trick_index", "played_mask", "bet", "tricks_won"])
+
+
+class SeatModel:
+    """
+    Seating of a game with the playing order for every possible leader worked out up front. Seats are positions in
+    the players list and offsets count from the player leading the trick, so both are plain ints
+    """
+
+    def __init__(self, players: List[Agent]):
+        num_players = len(players)
+        self.players = tuple(players)
+        self.seat_of = {}
+        self.by_index = {}
+        for seat, player in enumerate(players):
+            self.seat_of[player.index] = seat
+            self.by_index[player.index] = player
+        self.rotations = []
+        self.offsets = []
+        for leader in range(num_players):
+            self.rotations.append(tuple(players[(leader + offset) % num_players] for offset in range(num_players)))
+            self.offsets.append({player.index: (seat - leader) % num_players for seat, player in enumerate(players)})
+
+    def playing_order(self, leader_seat):
+        return self.rotations[leader_seat]
+
+    def offset(self, leader_seat, player_index):
+        """
+        :return: how many players play before player_index in a trick led from leader_seat
+        """
+        return self.offsets[leader_seat][player_index]
+
+
+class TrickContext:
+    """
+    Decision context for the trick in progress. It is updated incrementally as each card is placed so agents can
+    build their state from it without rescanning the board
+    """
+
+    def __init__(self, seats: SeatModel):
+        """
+        :param seats: seating of the game, the first seat leads the first trick
+        """
+        self.seats = seats
+        self.cards_per_player = round(52/len(seats.players))
+        self.trick_index = 0
+        self.start_trick(0)
+
+    def start_trick(self, leader_seat):
+        """
+        Reset the per trick fields and point seat_offsets at the precomputed offsets for the new leader
+        """
+        self.lead_suit = None
+        self.winning_card = None
+        self.winning_position = None
+        self.winning_strength = 0
+        self.strength_offset = 0
+        self.leader_seat = leader_seat
+        self.seat_offsets = self.seats.offsets[leader_seat]
+
+    def place_card(self, card, position):
+        """
+        Update the lead suit and current winning card with the card placed at position in the trick
+        """
+        card_id = cards.card_id(card)
+        if position == 0:
+            self.lead_suit = card.suit
+            self.strength_offset = card_id // 13 * 52
+        strength = cards.TRICK_STRENGTH[self.strength_offset + card_id]
+        if strength > self.winning_strength:
+            self.winning_card = card
+            self.winning_position = position
+            self.winning_strength = strength
+
+    def end_trick(self, next_leader_seat):
+        self.trick_index += 1
+        self.start_trick(next_leader_seat)
+
+
+class PlayedCards:
+    """
+    Record of the cards played so far in a game, kept as a bitmask of card ids (see cards.py) and a list of them in
+    play order, along with the suits each player is known to be void in. Every update is O(1) so agents can query it
+    on every decision
+    """
+
+    def __init__(self, players: List[Agent]):
+        self.mask = 0
+        self.history = []
+        self.spades_played = 0
+        self.voids = {}
+        for player in players:
+            self.voids[player.index] = 0
+
+    def record(self, card, player_index, position, lead_suit):
+        """
+        Record a card and infer voids from it. A non spade that doesn't follow the lead suit means the player has
+        none of the lead suit, and leading a spade means the player only holds spades
+        :param card: card placed on the board
+        :param player_index: index of the player placing it
+        :param position: position of the card in the trick, 0 being the lead
+        :param lead_suit: suit of the card leading the trick
+        """
+        card_id = cards.card_id(card)
+        self.mask |= 1 << card_id
+        self.history.append(card_id)
+        suit = card_id // 13
+        if suit == cards.SPADES:
+            self.spades_played += 1
+            if position == 0:
+                self.voids[player_index] |= 0b1110
+        elif card.suit != lead_suit:
+            self.voids[player_index] |= 1 << cards.SUIT_INDEX[lead_suit]
+
+    def is_played(self, card) -> bool:
+        return bool(self.mask >> cards.card_id(card) & 1)
+
+    def count(self) -> int:
+        return bin(self.mask).count("1")
+
+    def is_void(self, player_index, suit) -> bool:
+        return bool(self.voids[player_index] >> cards.SUIT_INDEX[suit] & 1)
+
+    def void_suits(self, player_index):
+        return [suit for suit in cards.SUITS if self.is_void(player_index, suit)]
+
+    def spades_broken(self) -> bool:
+        return self.spades_played > 0
+
+    def spades_remaining(self) -> int:
+        """
+        :return: number of spades in the deck that have not been played yet
+        """
+        return 13 - self.spades_played
+
+    def unseen_mask(self, hand) -> int:
+        """
+        :param hand: cards held by the player asking
+        :return: bitmask of cards that are neither played nor in hand, i.e. held by the other players
+        """
+        return cards.FULL_DECK & ~self.mask & ~cards.cards_to_mask(hand)
+
+
 class Spades:
 
-    def __init__(self, players: List[Agent], verbose=False, simple_scoring=False, even_decks=False):
+    def __init__(self, players: List[Agent], verbose=False, simple_scoring=False, even_decks=False, deal_seed=None,
+                 early_termination=False, event_log=None):
         """
         :param players: List of Agents to play a simulated game
         :param verbose: will print out satements on game acitojns
         :param simple_scoring: If true will just score based on who wins the most tricks
+        :param deal_seed: if given the deck is shuffled with this seed, so the same seed always deals the same hands.
+            Otherwise the standard deck order is dealt
+        :param early_termination: stop the game as soon as the remaining tricks can't change who has the highest final
+            score. Meant for evaluation: learning agents don't get a terminal reward for a game stopped early
+        :param event_log: optional events.EventLog the game's events are written to
         """
-        self.deck = pyCardDeck.Deck()
-        self.deck.load_standard_deck()
+        self.deck = cards.standard_deck()
+        self.deal_seed = deal_seed
+        if deal_seed is not None:
+            random.Random(deal_seed).shuffle(self.deck)
         self.players = players
         self.bets = Spades.initialize_player_dict(players)
         self.scores = Spades.initialize_player_dict(players)
@@ -24,7 +180,16 @@ class Spades:
         self.final_scores = Spades.initialize_player_dict(players)
         self.simple_scoring = simple_scoring
         self.even_decks = even_decks
+        self.early_termination = early_termination
+        self.tricks_skipped = 0
+        self.event_log = event_log
+        self.log_level = event_log.level if event_log is not None else events.OFF
+        self.game_id = None
         Spades.assert_unique_index(players)
+        self.seats = SeatModel(players)
+        self.leader_seat = 0
+        self.context = TrickContext(self.seats)
+        self.played = PlayedCards(players)
 
 
     @classmethod
@@ -34,7 +199,12 @@ class Spades:
         if not len(indexes_list) == len(indexes_set):
             raise AssertionError("All players must have a unique index")
 
-    def play_x_games(self, num_games=100, even_decks=False):
+    def play_x_games(self, num_games=100, even_decks=False, metrics=None, early_termination=False, event_log=None):
+        """
+        :param metrics: optional metrics.MetricsWriter recording every finished game
+        :param early_termination: stop each game once its winner is decided, see __init__
+        :param event_log: optional events.EventLog recording every game
+        """
         score_board = Spades.initialize_player_dict(self.players)
         win_losses = Spades.initialize_player_dict(self.players)
         score_board_last_100 = Spades.initialize_player_dict(self.players)
@@ -46,8 +216,11 @@ class Spades:
         for game in range(num_games):
             shuffled_first_move = sorted(self.players, key=lambda k: random.random())
             random.shuffle(self.players)
-            new_game = Spades(shuffled_first_move, even_decks=even_decks)
+            new_game = Spades(shuffled_first_move, even_decks=even_decks, early_termination=early_termination,
+                              event_log=event_log)
             new_game.play_spades()
+            if metrics is not None:
+                metrics.record_game(new_game)
             order_index = 0
             for player in self.players:
                 score_board[player.index] += new_game.final_scores[player.index]
@@ -84,9 +257,57 @@ class Spades:
         self.place_bets()
         while not self.terminal_test():
             self.play_turn()
+            if self.early_termination and self.outcome_decided():
+                self.stop_early()
         self.score_game()
         for player in self.players:
             player.end_episode()
+        self.print_results()
+
+    def iter_play(self):
+        """
+        Generator version of play_spades that hands every card decision to the caller instead of the agents. Deals and
+        takes bets from the agents as usual, then yields a DecisionPoint for each card to play and expects the card to
+        be sent back. Tricks and scoring follow the same rules as play_spades but agent episode and learning hooks are
+        not called, the driver is responsible for them
+            decisions = game.iter_play()
+            decision = next(decisions)
+            while True:
+                try:
+                    decision = decisions.send(choose(decision))
+                except StopIteration as end:
+                    final_scores = end.value
+                    break
+        :return: final_scores, through StopIteration
+        """
+        self.initial_deal(self.even_decks)
+        self.place_bets()
+        while not self.terminal_test():
+            playing_order = self.get_playing_order()
+            for index, player in enumerate(playing_order):
+                legal_moves = self.get_legal_moves(player)
+                card = yield DecisionPoint(player, self.seats.seat_of[player.index], legal_moves, self.observe(player))
+                if card not in legal_moves:
+                    raise ValueError("Illegal move " + str(card) + " for player " + str(player.index))
+                self.place_card(card, player, index)
+                if self.verbose:
+                    print("Player ", player.index, " made move ", str(card))
+            self.finish_trick()
+            if self.early_termination and self.outcome_decided():
+                self.stop_early()
+        self.score_game()
+        self.print_results()
+        return self.final_scores
+
+    def observe(self, player: Agent) -> Observation:
+        """
+        :return: what player can see when deciding which card to play
+        """
+        board = tuple(self.board[index] for index in range(len(self.board)))
+        return Observation(tuple(player.hand), board, self.context.trick_index, self.played.mask,
+                           self.bets[player.index], self.scores[player.index])
+
+    def print_results(self):
         if self.verbose:
             print("Score ", str(self.scores))
             print("bets ", str(self.bets))
@@ -109,7 +330,6 @@ class Spades:
                     player.update(player.last_action, self, last_reward)
                     player.save_state(self)
                 player.last_action = action
-                test_state = player.create_state_action_rep(self, action)
                 card = player.map_legal_actions_to_action(action, self)
             else:
                 card = player.getAction(self)
@@ -117,14 +337,21 @@ class Spades:
             if self.verbose:
                 print("Player ", player.index, " made move ", str(card))
             index += 1
-        self.update_winner()
-        self.board = {}
-        self.order_played = {}
+        self.finish_trick()
         for player in playing_order:
             if type(player) == QLearningAgent:
                 reward = self.reward_function(player)
                 player.last_reward = reward
 
+    def finish_trick(self):
+        """
+        Credit the trick to its winner and clear the board for the next one
+        """
+        self.update_winner()
+        self.board = {}
+        self.order_played = {}
+        self.context.end_trick(self.leader_seat)
+
     def reward_function(self, agent: Agent):
         max_score = 0
         for player in self.players:
@@ -147,36 +374,66 @@ class Spades:
                 reward = -10 * multiplier
         return reward
 
+    def final_score(self, bet, tricks):
+        if self.simple_scoring:
+            return tricks * 10
+        if bet > tricks:
+            return 0
+        elif bet == tricks:
+            return bet * 10
+        else:
+            return bet * 10 - (tricks - bet) * 10
+
+    def outcome_decided(self) -> bool:
+        """
+        Check between tricks whether one player has the highest final score however the remaining tricks fall
+        :return: True if some player's worst possible final score beats every other player's best possible one
+        """
+        tricks_left = len(self.players[0].hand)
+        lowest = {}
+        highest = {}
+        for player in self.players:
+            tricks = self.scores[player.index]
+            possible = [self.final_score(self.bets[player.index], tricks + extra) for extra in range(tricks_left + 1)]
+            lowest[player.index] = min(possible)
+            highest[player.index] = max(possible)
+        for player in self.players:
+            others_best = max(highest[other.index] for other in self.players if other is not player)
+            if lowest[player.index] > others_best:
+                return True
+        return False
+
+    def stop_early(self):
+        """
+        End a decided game by discarding the unplayed cards. Scoring the tricks taken so far keeps the same winner
+        """
+        self.tricks_skipped = len(self.players[0].hand)
+        for player in self.players:
+            player.hand.clear()
+        if self.verbose:
+            print("Outcome decided, skipping the last ", self.tricks_skipped, " tricks")
+
     def score_game(self):
         for player in self.players:
-            player_bet = self.bets[player.index]
-            player_score = self.scores[player.index]
-            if not self.simple_scoring:
-                if player_bet > player_score:
-                    continue
-                elif player_bet == player_score:
-                    self.final_scores[player.index] = player_bet * 10
-                elif player_bet < player_score:
-                    difference = player_score - player_bet
-                    self.final_scores[player.index] = player_bet * 10 - (difference * 10)
-            else:
-                self.final_scores[player.index] = player_score * 10
+            self.final_scores[player.index] = self.final_score(self.bets[player.index], self.scores[player.index])
+        if self.log_level >= events.GAME:
+            self.event_log.emit({"game": self.game_id, "event": "score",
+                                 "tricks": [[index, tricks] for index, tricks in self.scores.items()],
+                                 "final_scores": [[index, score] for index, score in self.final_scores.items()],
+                                 "tricks_skipped": self.tricks_skipped})
 
     def get_legal_moves(self, player: Agent):
-        spades_in_hand = list(filter(lambda card: card.suit == "Spades", player.hand))
-        count_spades_in_hand = len(spades_in_hand)
-        has_other_cards = len(player.hand) != count_spades_in_hand
-        if not self.board and has_other_cards:
-            return list(filter(lambda card: card.suit != "Spades", player.hand))
-        elif not self.board and not has_other_cards:
+        """
+        Looks up the suits player may play in cards.LEGAL_SUITS from the suits held and the lead suit
+        """
+        held = 0
+        for card in player.hand:
+            held |= cards.SUIT_BITS[card.suit]
+        lead = cards.SUIT_INDEX[self.board[0].suit] if self.board else cards.NO_LEAD
+        allowed = cards.LEGAL_SUITS[held * 5 + lead]
+        if allowed == held:
             return player.hand
-        else:
-            first_card_suit = self.board[0].suit
-            same_suit_cards_in_hand = list(filter(lambda card: card.suit == first_card_suit, player.hand))
-            if same_suit_cards_in_hand:
-                return same_suit_cards_in_hand + spades_in_hand
-            else:
-                return player.hand
+        return [card for card in player.hand if cards.SUIT_BITS[card.suit] & allowed]
 
 
     def place_bets(self):
@@ -185,35 +442,29 @@ class Spades:
             self.bets[player.index] = player_bet
             if self.verbose:
                 print("Player ", player.index, " places bet ", player_bet)
+            if self.log_level >= events.GAME:
+                self.event_log.emit({"game": self.game_id, "event": "bet", "player": player.index, "bet": player_bet})
 
 
     def place_card(self, card, player, index):
         player.hand.remove(card)
         self.board[index] = card
         self.order_played[index] = player.index
+        self.context.place_card(card, index)
+        self.played.record(card, player.index, index, self.context.lead_suit)
+        if self.log_level >= events.PLAY:
+            self.event_log.emit({"game": self.game_id, "event": "play", "player": player.index,
+                                 "card": cards.card_id(card), "position": index})
 
 
     def get_playing_order(self):
-        if self.player_won_last_hand is None:
-            return self.players
-        else:
-            temp_players = self.players.copy()
-            starting_player = temp_players.index(self.player_won_last_hand)
-            result = []
-            count = starting_player
-            for i in range(len(temp_players)):
-                try:
-                    result.append(temp_players[count])
-                except IndexError:
-                    count = 0
-                    result.append(temp_players[count])
-                count += 1
-            return result
+        """
+        :return: tuple of players in the order they play the current trick
+        """
+        return self.seats.rotations[self.leader_seat]
 
     def get_player_by_index(self, index):
-        for p in self.players:
-            if p.index == index:
-                return p
+        return self.seats.by_index.get(index)
 
 
     @classmethod
@@ -244,17 +495,22 @@ class Spades:
             players[0].hand = decks[0]
             players[1].hand = decks[1]
         else:
-            while len(self.deck) > 0:
-                for player in self.players:
-                    next_card = self.deck.draw()
-                    player.hand.append(next_card)
-                    if self.verbose:
-                        print("Player ", player.index, " dealt card ", str(next_card))
+            for position, next_card in enumerate(self.deck):
+                player = self.players[position % len(self.players)]
+                player.hand.append(next_card)
+                if self.verbose:
+                    print("Player ", player.index, " dealt card ", str(next_card))
+            self.deck = []
+        if self.event_log is not None:
+            self.game_id = self.event_log.new_game()
+            if self.log_level >= events.GAME:
+                hands = [[player.index, [cards.card_id(card) for card in player.hand]] for player in self.players]
+                self.event_log.emit({"game": self.game_id, "event": "deal", "hands": hands,
+                                     "deal_seed": self.deal_seed, "simple_scoring": self.simple_scoring,
+                                     "early_termination": self.early_termination})
 
     @staticmethod
     def create_even_decks():
-        deck = pyCardDeck.Deck()
-        deck.load_standard_deck()
         ranks = [2, 3, 4, 5, 6, 7, 8, 9, 10, "J", "Q", "K"]
         suits = ["Spades", "Diamonds", "Clubs", "Hearts"]
         index = 0
@@ -272,33 +528,21 @@ class Spades:
 
     @staticmethod
     def create_card(suit, rank):
-        return pyCardDeck.PokerCard(suit, rank, "Card")
+        return cards.create_card(suit, rank)
 
     def update_winner(self):
-        max_card = None
-        winner_index = None
-        first_card = self.board[0]
-        first_card_suit = first_card.suit
-        for card_index in self.board:
-            card = self.board[card_index]
-            if max_card is None:
-                max_card = card
-                winner_index = card_index
-            elif card.suit == "Spades" and max_card.suit != "Spades":
-                max_card = card
-                winner_index = card_index
-            elif card.suit == first_card_suit and\
-                    Agent.convert_card_rank_to_int(card) > Agent.convert_card_rank_to_int(first_card):
-                max_card = card
-                winner_index = card_index
-        if max_card is None:
-            max_card = first_card
-            winner_index = 0
+        trick = [cards.card_id(self.board[card_index]) for card_index in range(len(self.board))]
+        winner_index = cards.trick_winner(trick)
+        max_card = self.board[winner_index]
         player_who_won = self.order_played[winner_index]
         self.player_won_last_hand = self.get_player_by_index(player_who_won)
+        self.leader_seat = self.seats.seat_of[player_who_won]
         self.scores[player_who_won] += 1
         if self.verbose:
             print("Player ", player_who_won, " won turn with card ", str(max_card))
+        if self.log_level >= events.TRICK:
+            self.event_log.emit({"game": self.game_id, "event": "trick", "trick": self.context.trick_index,
+                                 "winner": player_who_won, "card": trick[winner_index]})
 
     def cards_on_board(self):
         return bool(self.board)
@@ -312,39 +556,50 @@ class Spades:
 
 
 
-import pickle
-import datetime as dt
-import numpy as np
 import sys
 import os
 
-def run_x_games_and_pickle(players, num_games, pickle_index=[0], directory="agentdata", even_decks=False):
+def run_x_games_and_pickle(players, num_games, pickle_index=[0], directory="agentdata", even_decks=False,
+                           metrics_path=None):
     """
     run many games with players and pickle
+    :param metrics_path: CSV file to stream per game metrics to, see metrics.py
     """
+    from metrics import MetricsWriter
+    metrics = MetricsWriter(metrics_path) if metrics_path is not None else None
     try:
         game = Spades(players)
-        game.play_x_games(num_games, even_decks=even_decks)
-        for p in players:
-            if p.index in pickle_index:
-                p.last_state = None
-                file_name = directory + "\\" + str(p.index) + "QLAGENT_GAMES_" + str(num_games) + get_time_stamp() + ".p"
-                pickle.dump(p, open(file_name, "wb"))
+        game.play_x_games(num_games, even_decks=even_decks, metrics=metrics)
+        pickle_players(players, pickle_index, directory, num_games)
     except KeyboardInterrupt:
         print('Interrupted')
-        for pick in pickle_index:
-            player = players[pick]
-            player.last_state = None
-            file_name = directory + "\\" + "QLAGENT_GAMES_" + str(num_games) + get_time_stamp() + ".p"
-            pickle.dump(player, open(file_name, "wb"))
+        pickle_players(players, pickle_index, directory, num_games)
         try:
             sys.exit(0)
         except SystemExit:
             os._exit(0)
+    finally:
+        if metrics is not None:
+            metrics.close()
+
 
+def pickle_players(players, pickle_index, directory, num_games):
+    """
+    Pickle the players whose index is in pickle_index to directory. See checkpoint.py for training that survives
+    being killed
+    """
+    import pickle
+    os.makedirs(directory, exist_ok=True)
+    for p in players:
+        if p.index in pickle_index:
+            p.last_state = None
+            file_name = str(p.index) + "QLAGENT_GAMES_" + str(num_games) + get_time_stamp() + ".p"
+            with open(os.path.join(directory, file_name), "wb") as f:
+                pickle.dump(p, f)
 
 
 def get_time_stamp():
+    import datetime as dt
     time_stamp = dt.datetime.now()
     day = str(time_stamp.day)
     hour = str(time_stamp.hour)
@@ -0,0 +1,126 @@
+"""
+Hyperparameter sweeps for QLearningAgent. Each point of a grid or random search space is trained and evaluated against
+RandomAgents on a process pool, and every finished point is cached on disk keyed by its config, the code version and
+the seed, so rerunning a sweep only runs the points that are new or didn't finish
+"""
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from agents import QLearningAgent, RandomAgent, FrozenQAgent
+from evaluation import train, evaluate
+from result_cache import ResultCache, hash_key, code_version
+
+AGENT_PARAMETERS = ["alpha", "epsilon", "gamma"]
+
+
+def grid(space):
+    """
+    :param space: dict of parameter name to list of values
+    :return: list of configs, one per combination of values
+    """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_search(space, num_points, seed=0):
+    """
+    :param space: dict of parameter name to either a list of values to choose from or a (low, high) tuple to draw
+        uniformly from
+    :return: list of num_points configs
+    """
+    rng = random.Random(seed)
+    configs = []
+    for point in range(num_points):
+        config = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                config[name] = rng.uniform(values[0], values[1])
+            else:
+                config[name] = rng.choice(values)
+        configs.append(config)
+    return configs
+
+
+def run_config(config, train_games, eval_games, seed):
+    """
+    Train a QLearningAgent with config and evaluate its frozen policy.
+    Keys of config are alpha, epsilon, gamma, num_players or the name of an action whose reward multiplier to set
+    :return: evaluation results with the size of the learnt Q table
+    """
+    random.seed(seed)
+    rng = random.Random(seed)
+    agent_parameters = {}
+    multipliers = {}
+    num_players = 2
+    for name, value in config.items():
+        if name in AGENT_PARAMETERS:
+            agent_parameters[name] = value
+        elif name == "num_players":
+            num_players = value
+        elif name in QLearningAgent.reward_multipliers:
+            multipliers[name] = value
+        else:
+            raise ValueError("Unknown sweep parameter " + name)
+    learner = QLearningAgent(0, reward_multipliers=multipliers, **agent_parameters)
+    opponents = [RandomAgent(index) for index in range(1, num_players)]
+    train(learner, opponents, train_games, rng)
+    result = evaluate(FrozenQAgent.from_agent(learner, seed=seed), opponents, eval_games, rng)
+    result["q_table_size"] = len(learner.q_values)
+    return result
+
+
+def run_sweep(configs, train_games=1000, eval_games=200, seeds=(0,), cache_dir="sweeps", processes=None):
+    """
+    :param configs: list of configs, e.g. from grid or random_search
+    :param seeds: every config is run once per seed
+    :param processes: worker processes, defaults to the number of CPUs
+    :return: list of result dicts holding config, seed and the evaluation results
+    """
+    cache = ResultCache(cache_dir)
+    version = code_version("sweep.py")
+    results = []
+    pending = []
+    for config in configs:
+        for seed in seeds:
+            key = hash_key(config, version, seed, train_games, eval_games)
+            cached = cache.get(key)
+            if cached is not None:
+                results.append(cached)
+            else:
+                pending.append((key, config, seed))
+    if not pending:
+        return results
+    with ProcessPoolExecutor(processes) as pool:
+        futures = {}
+        for key, config, seed in pending:
+            futures[pool.submit(run_config, config, train_games, eval_games, seed)] = (key, config, seed)
+        for future in as_completed(futures):
+            key, config, seed = futures[future]
+            result = dict(future.result(), config=config, seed=seed)
+            cache.put(key, result)
+            results.append(result)
+    return results
+
+
+def summarize(results, metric="win_rate"):
+    """
+    Average metric over the seeds of each config
+    :return: list of (config, mean metric) sorted best first
+    """
+    totals = {}
+    for result in results:
+        key = hash_key(result["config"])
+        if key not in totals:
+            totals[key] = [result["config"], 0.0, 0]
+        totals[key][1] += result[metric]
+        totals[key][2] += 1
+    summary = [(config, total / count) for config, total, count in totals.values()]
+    return sorted(summary, key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    space = {"alpha": [.2, .4, .6], "epsilon": [.05, .1, .2], "gamma": [.9, 1]}
+    sweep_results = run_sweep(grid(space), train_games=2000, eval_games=500, seeds=(0, 1))
+    for best_config, win_rate in summarize(sweep_results)[:5]:
+        print(best_config, win_rate)
@@ -0,0 +1,287 @@
+"""
+Exact double dummy results for the last few tricks of a game.
+
+Positions are taken at the start of a trick with seats numbered in play order, seat 0 leading. Only the relative order
+of the remaining cards within each suit matters, so cards are compressed to their rank among the remaining cards of
+their suit and the non spade suits are permuted so hearts hold the most cards and clubs the fewest. A compressed
+position is then one of those canonical compositions, a count of cards per suit, plus the owner of each card. Every
+seat owns cards_per_player of them, so the owner sequences are ranked with a multinomial index, giving a dense index
+into a table of canonical compositions * (num_players * cards_per_player)! / cards_per_player! ** num_players entries.
+
+Each player is assumed to maximise their own tricks knowing every hand (max^n). Among moves giving them the same
+tricks they prefer the one leaving fewer tricks to the next player in play order, then the one after, see preference.
+The rule only looks at results, never at which cards are played, so positions that differ by a permutation of the non
+spade suits or by rank compression get the same value. With 2 players every tie gives the same result anyway. An
+entry stores the tricks each seat takes from that position as 4 bit fields of a uint16, 0xFFFF meaning unsolved, which
+only a partly generated table holds. Tables are saved as .npy files, one per number of cards, and memory mapped when
+loaded.
+"""
+import math
+import os
+from functools import lru_cache
+import numpy as np
+import cards
+
+UNSOLVED = 0xFFFF
+
+
+def compositions(total):
+    """
+    :return: every canonical (spades, hearts, diamonds, clubs) count of remaining cards adding up to total, i.e. with
+        hearts >= diamonds >= clubs
+    """
+    result = []
+    for spades in range(min(total, 13) + 1):
+        for hearts in range(min(total - spades, 13) + 1):
+            for diamonds in range(min(total - spades - hearts, hearts) + 1):
+                clubs = total - spades - hearts - diamonds
+                if clubs <= diamonds:
+                    result.append((spades, hearts, diamonds, clubs))
+    return result
+
+
+def canonical_suit_order(counts):
+    """
+    :param counts: cards per suit
+    :return: suits in canonical order, spades then the others by decreasing count
+    """
+    return [0] + sorted([1, 2, 3], key=lambda suit: counts[suit], reverse=True)
+
+
+@lru_cache(maxsize=None)
+def multinomial(counts):
+    """
+    :param counts: tuple of counts
+    :return: number of distinct orderings of sum(counts) items with counts[i] copies of item i
+    """
+    result = math.factorial(sum(counts))
+    for count in counts:
+        result //= math.factorial(count)
+    return result
+
+
+def sequence_index(sequence, num_players, num_cards):
+    """
+    :param sequence: owner of each card, every seat owning num_cards of them
+    :return: rank of sequence in the lexicographic order of owner_sequences
+    """
+    remaining = [num_cards] * num_players
+    index = 0
+    for owner in sequence:
+        for seat in range(owner):
+            if remaining[seat]:
+                remaining[seat] -= 1
+                index += multinomial(tuple(remaining))
+                remaining[seat] += 1
+        remaining[owner] -= 1
+    return index
+
+
+def preference(value, seat):
+    """
+    Sort key of the results a player in seat chooses between, the largest being played
+    :param value: tuple of tricks each seat takes
+    """
+    num_players = len(value)
+    return (value[seat],) + tuple(-value[(seat + offset) % num_players] for offset in range(1, num_players))
+
+
+def owner_sequences(counts):
+    """
+    Every ordering of owners with counts[seat] cards for each seat
+    """
+    if not any(counts):
+        yield ()
+        return
+    for seat in range(len(counts)):
+        if counts[seat]:
+            counts[seat] -= 1
+            for rest in owner_sequences(counts):
+                yield (seat,) + rest
+            counts[seat] += 1
+
+
+class Tablebase:
+
+    def __init__(self, num_players, tables=None):
+        """
+        :param num_players: 2 or 4
+        :param tables: dict of cards per player to table array
+        """
+        self.num_players = num_players
+        self.tables = tables if tables is not None else {}
+        self.composition_index = {}
+        self.composition_lists = {}
+
+    @staticmethod
+    def table_path(directory, num_players, num_cards):
+        return os.path.join(directory, "tablebase_" + str(num_players) + "p_" + str(num_cards) + ".npy")
+
+    @classmethod
+    def load(cls, directory, num_players, max_cards=None):
+        """
+        Memory map every table found in directory for num_players, up to max_cards cards per player
+        """
+        tables = {}
+        num_cards = 1
+        while max_cards is None or num_cards <= max_cards:
+            path = Tablebase.table_path(directory, num_players, num_cards)
+            if not os.path.exists(path):
+                break
+            tables[num_cards] = np.load(path, mmap_mode="r")
+            num_cards += 1
+        return cls(num_players, tables)
+
+    def max_cards(self):
+        return max(self.tables) if self.tables else 0
+
+    def sequences_per_composition(self, num_cards):
+        return multinomial((num_cards,) * self.num_players)
+
+    def table_size(self, num_cards):
+        return len(self.compositions_for(num_cards)) * self.sequences_per_composition(num_cards)
+
+    def compositions_for(self, num_cards):
+        if num_cards not in self.composition_lists:
+            comps = compositions(self.num_players * num_cards)
+            self.composition_lists[num_cards] = comps
+            self.composition_index[num_cards] = {comp: i for i, comp in enumerate(comps)}
+        return self.composition_lists[num_cards]
+
+    def index(self, masks):
+        """
+        :param masks: card masks of each seat in play order, all holding the same number of cards
+        :return: (cards per player, index into that table)
+        """
+        num_cards = bin(masks[0]).count("1")
+        union = 0
+        for mask in masks:
+            union |= mask
+        suit_owners = []
+        for suit in range(4):
+            owners = []
+            for card in cards.mask_to_ids(union & cards.SUIT_MASKS[1 << suit]):
+                for seat in range(self.num_players):
+                    if masks[seat] >> card & 1:
+                        owners.append(seat)
+                        break
+            suit_owners.append(owners)
+        self.compositions_for(num_cards)
+        sequence = []
+        comp = []
+        for suit in canonical_suit_order([len(owners) for owners in suit_owners]):
+            comp.append(len(suit_owners[suit]))
+            sequence.extend(suit_owners[suit])
+        return num_cards, self.composition_index[num_cards][tuple(comp)] * self.sequences_per_composition(num_cards) + \
+            sequence_index(sequence, self.num_players, num_cards)
+
+    def value(self, masks):
+        """
+        :param masks: card masks of each seat in play order, at the start of a trick
+        :return: tuple of tricks each seat takes from here
+        """
+        num_cards = bin(masks[0]).count("1")
+        if num_cards == 0:
+            return (0,) * self.num_players
+        if num_cards == 1:
+            winner = cards.trick_winner([mask.bit_length() - 1 for mask in masks])
+            return tuple(int(seat == winner) for seat in range(self.num_players))
+        if num_cards not in self.tables:
+            raise ValueError("Tablebase covers up to " + str(self.max_cards()) + " cards per player, position has " +
+                             str(num_cards))
+        num_cards, index = self.index(masks)
+        packed = int(self.tables[num_cards][index])
+        if packed == UNSOLVED:
+            raise KeyError("Position not solved in tablebase")
+        return tuple(packed >> (4 * seat) & 15 for seat in range(self.num_players))
+
+    def solve_trick(self, masks, trick):
+        """
+        Play out the rest of the current trick with max^n and finish the game from the table
+        :param masks: card masks of each seat in play order, seat 0 having led the trick
+        :param trick: card ids already played this trick
+        :return: (tuple of tricks each seat takes from here including this trick, best card id for the next seat)
+        """
+        seat = len(trick)
+        if seat == self.num_players:
+            winner = cards.trick_winner(trick)
+            rotated = [masks[(winner + offset) % self.num_players] for offset in range(self.num_players)]
+            future = self.value(rotated)
+            result = []
+            for player in range(self.num_players):
+                result.append(future[(player - winner) % self.num_players] + (1 if player == winner else 0))
+            return tuple(result), None
+        lead_suit = trick[0] // 13 if trick else None
+        best_value = None
+        best_card = None
+        for card in cards.legal_card_ids(cards.mask_to_ids(masks[seat]), lead_suit):
+            next_masks = list(masks)
+            next_masks[seat] ^= 1 << card
+            value = self.solve_trick(next_masks, trick + [card])[0]
+            if best_value is None or preference(value, seat) > preference(best_value, seat):
+                best_value = value
+                best_card = card
+        return best_value, best_card
+
+    def seat_masks(self, game):
+        playing_order = game.get_playing_order()
+        return [cards.cards_to_mask(player.hand) for player in playing_order], playing_order
+
+    def tricks_remaining(self, game):
+        """
+        :param game: Spades game between tricks with at most max_cards() cards per player
+        :return: dict of player index to the tricks they take from here with perfect play
+        """
+        if game.cards_on_board():
+            raise ValueError("Tablebase values are for positions between tricks")
+        masks, playing_order = self.seat_masks(game)
+        value = self.value(masks)
+        return {player.index: value[seat] for seat, player in enumerate(playing_order)}
+
+    def best_card(self, game, player):
+        """
+        :param game: Spades game where it is player's turn and every hand fits in the tablebase
+        :return: card from player's hand with the best perfect play result for player
+        """
+        masks = self.seat_masks(game)[0]
+        trick = [cards.card_id(game.board[position]) for position in range(len(game.board))]
+        best_card_id = self.solve_trick(masks, trick)[1]
+        for card in player.hand:
+            if cards.card_id(card) == best_card_id:
+                return card
+
+
+def generate(directory, num_players, max_cards):
+    """
+    Solve every canonical position with up to max_cards cards per player, in index order, each table using the one
+    below it, and save them to directory
+    :return: Tablebase using the saved tables
+    """
+    os.makedirs(directory, exist_ok=True)
+    tablebase = Tablebase(num_players)
+    for num_cards in range(1, max_cards + 1):
+        table = np.full(tablebase.table_size(num_cards), UNSOLVED, dtype=np.uint16)
+        tablebase.tables[num_cards] = table
+        sequences = list(owner_sequences([num_cards] * num_players))
+        index = 0
+        for comp in tablebase.compositions_for(num_cards):
+            for sequence in sequences:
+                masks = [0] * num_players
+                position = 0
+                for suit in range(4):
+                    for rank in range(comp[suit]):
+                        masks[sequence[position]] |= 1 << (suit * 13 + rank)
+                        position += 1
+                value = tablebase.solve_trick(masks, [])[0]
+                packed = 0
+                for seat in range(num_players):
+                    packed |= value[seat] << (4 * seat)
+                table[index] = packed
+                index += 1
+        np.save(Tablebase.table_path(directory, num_players, num_cards), table)
+    return Tablebase.load(directory, num_players, max_cards)
+
+
+if __name__ == "__main__":
+    generate("tablebase", 2, 4)
+    generate("tablebase", 4, 2)
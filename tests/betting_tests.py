@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+import cards
+from betting import BetEstimator
+from pyCardDeck import PokerCard
+
+
+class BetEstimatorTests(unittest.TestCase):
+
+    def test_signature_ignores_non_spade_suit_names(self):
+        hearts = [cards.card_id(PokerCard("Hearts", 10, "Ten")), cards.card_id(PokerCard("Spades", 3, "Three"))]
+        clubs = [cards.card_id(PokerCard("Clubs", 10, "Ten")), cards.card_id(PokerCard("Spades", 3, "Three"))]
+        spade = [cards.card_id(PokerCard("Clubs", 10, "Ten")), cards.card_id(PokerCard("Spades", 4, "Four"))]
+        self.assertEqual(BetEstimator.hand_signature(hearts, 2), BetEstimator.hand_signature(clubs, 2))
+        self.assertNotEqual(BetEstimator.hand_signature(clubs, 2), BetEstimator.hand_signature(spade, 2))
+
+    def test_estimate_is_cached_and_saved(self):
+        hand = [PokerCard(suit, rank, str(rank)) for suit in ["Spades", "Hearts"] for rank in range(2, 15)
+                if rank != 14] + [PokerCard("Spades", "A", "Ace"), PokerCard("Hearts", "A", "Ace")]
+        path = os.path.join(tempfile.mkdtemp(), "bets.p")
+        estimator = BetEstimator(num_simulations=5, path=path, seed=1)
+        first = estimator.expected_tricks(hand)
+        self.assertEqual(first, estimator.expected_tricks(hand))
+        self.assertEqual((1, 1), (estimator.hits, estimator.misses))
+        self.assertGreaterEqual(first, 13)
+        estimator.save()
+        self.assertEqual(first, BetEstimator(path=path).expected_tricks(hand))
+
+    def test_saved_on_exit(self):
+        path = os.path.join(tempfile.mkdtemp(), "bets.p")
+        with BetEstimator(num_simulations=1, path=path, seed=1) as estimator:
+            estimator.expected_tricks([PokerCard("Spades", 2, "Two")], num_players=4)
+        self.assertEqual(estimator.cache, BetEstimator(path=path).cache)
+
+    def test_cache_is_bounded(self):
+        estimator = BetEstimator(num_simulations=1, max_entries=2, seed=1)
+        for spade_rank in [2, 3, 4]:
+            estimator.expected_tricks([PokerCard("Spades", spade_rank, str(spade_rank))], num_players=4)
+        self.assertEqual(2, len(estimator.cache))
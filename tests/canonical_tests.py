@@ -0,0 +1,24 @@
+import random
+import unittest
+import canonical
+
+
+class CanonicalTests(unittest.TestCase):
+
+    def test_suit_relabelling_gives_same_canonical_hand(self):
+        hand = [0, 5, 14, 20, 30, 44, 45]
+        relabelled = [canonical.permute_card(card, (0, 3, 1, 2)) for card in hand]
+        self.assertNotEqual(sorted(hand), sorted(relabelled))
+        self.assertEqual(canonical.canonical_hand(hand)[0], canonical.canonical_hand(relabelled)[0])
+
+    def test_moves_map_back_through_inverse(self):
+        rng = random.Random(3)
+        deck = list(range(52))
+        rng.shuffle(deck)
+        hands = [sum(1 << card for card in deck[:13]), sum(1 << card for card in deck[13:26])]
+        board = deck[26:28]
+        masks, canonical_board, perm = canonical.canonical_position(hands, board)
+        inverse = canonical.inverse_permutation(perm)
+        self.assertEqual(board, [canonical.permute_card(card, inverse) for card in canonical_board])
+        self.assertEqual(hands[0], canonical.permute_mask(masks[0], inverse))
+        self.assertEqual(0, perm[0])
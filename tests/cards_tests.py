@@ -0,0 +1,72 @@
+import random
+import unittest
+import numpy as np
+import cards
+
+
+def reference_legal(hand, lead_suit):
+    if lead_suit is None:
+        non_spades = [card for card in hand if card >= 13]
+        return non_spades if non_spades else list(hand)
+    same_suit = [card for card in hand if card // 13 == lead_suit]
+    if not same_suit:
+        return list(hand)
+    return [card for card in hand if card // 13 == lead_suit or card < 13]
+
+
+def reference_winner(trick):
+    winner = 0
+    for position in range(1, len(trick)):
+        card = trick[position]
+        if card // 13 == trick[winner] // 13:
+            if card > trick[winner]:
+                winner = position
+        elif card < 13:
+            winner = position
+    return winner
+
+
+class CardTableTests(unittest.TestCase):
+
+    def test_legal_moves_match_rules(self):
+        rng = random.Random(5)
+        for i in range(500):
+            hand = rng.sample(range(52), rng.randint(1, 13))
+            lead_suit = rng.choice([None, 0, 1, 2, 3])
+            self.assertEqual(reference_legal(hand, lead_suit), cards.legal_card_ids(hand, lead_suit))
+            lead = cards.NO_LEAD if lead_suit is None else lead_suit
+            legal_mask = cards.legal_mask(sum(1 << card for card in hand), lead)
+            self.assertEqual(sorted(reference_legal(hand, lead_suit)), cards.mask_to_ids(legal_mask))
+
+    def test_trick_winner_matches_rules(self):
+        rng = random.Random(6)
+        tricks = [rng.sample(range(52), 4) for i in range(500)]
+        for trick in tricks:
+            self.assertEqual(reference_winner(trick), cards.trick_winner(trick))
+            self.assertEqual(reference_winner(trick[:2]), cards.trick_winner(trick[:2]))
+        batch = cards.trick_winners_batch(np.array(tricks))
+        self.assertEqual([reference_winner(trick) for trick in tricks], batch.tolist())
+
+
+class CardTests(unittest.TestCase):
+
+    def test_standard_deck_matches_pyCardDeck(self):
+        import pyCardDeck
+        deck = pyCardDeck.Deck()
+        deck.load_standard_deck()
+        self.assertEqual([card.name for card in deck], [card.name for card in cards.standard_deck()])
+        self.assertEqual(list(deck), cards.standard_deck())
+
+    def test_create_card(self):
+        card = cards.create_card("Hearts", "Q")
+        self.assertEqual("Queen of Hearts", card.name)
+        self.assertEqual(cards.card_id(card), cards.card_id(cards.card_from_id(cards.card_id(card))))
+
+    def test_engine_imports_without_third_party_modules(self):
+        import os
+        import subprocess
+        import sys
+        code = "import sys, spades; print(sorted(m for m in ('numpy', 'pyCardDeck', 'pickle') if m in sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=os.path.dirname(os.path.abspath(cards.__file__)))
+        self.assertEqual("[]", output.decode().strip())
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from cfr import CFRTrainer, CFRAgent, infoset_index, num_infosets, BOARDS, TURN_BUCKETS
+from spades import Spades
+
+
+class CFRTests(unittest.TestCase):
+
+    def test_infoset_index_is_dense(self):
+        for num_players in [2, 4]:
+            indexes = {infoset_index((board, turns, offset), num_players) for board in BOARDS
+                       for turns in TURN_BUCKETS for offset in range(num_players)}
+            self.assertEqual(set(range(num_infosets(num_players))), indexes)
+
+    def test_training_updates_tables(self):
+        trainer = CFRTrainer(2, seed=0)
+        trainer.train(20, batch_size=10)
+        self.assertEqual(20, trainer.games)
+        self.assertTrue(np.any(trainer.regrets))
+        strategy = trainer.average_strategy()
+        reached = trainer.strategy_sum.sum(axis=1) > 0
+        self.assertTrue(np.allclose(1, strategy[reached].sum(axis=1)))
+
+    def test_agent_only_plays_legal_cards(self):
+        trainer = CFRTrainer(4, seed=1)
+        trainer.train(8, batch_size=4)
+        players = [trainer.create_agent(index, seed=index, greedy=index % 2 == 0) for index in range(4)]
+        game = Spades(players, simple_scoring=True, deal_seed=3)
+        decisions = game.iter_play()
+        decision = next(decisions)
+        while True:
+            try:
+                decision = decisions.send(decision.player.getAction(game))
+            except StopIteration:
+                break
+        self.assertEqual(13, sum(game.scores.values()))
+
+    def test_save_and_load(self):
+        trainer = CFRTrainer(2, seed=2)
+        trainer.train(10)
+        path = os.path.join(tempfile.mkdtemp(), "cfr.npz")
+        trainer.save(path)
+        loaded = CFRTrainer.load(path)
+        self.assertEqual(2, loaded.num_players)
+        self.assertEqual(10, loaded.games)
+        self.assertEqual(trainer.create_agent().fingerprint(), loaded.create_agent().fingerprint())
+        self.assertNotEqual(CFRAgent().fingerprint(), loaded.create_agent().fingerprint())
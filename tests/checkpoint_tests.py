@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+import checkpoint
+from agents import QLearningAgent, RandomAgent
+from checkpoint import list_snapshots, load_snapshot, run_resumable
+from metrics import LearnerTelemetry, iter_rows, iter_telemetry
+
+
+class CrashingAgent(RandomAgent):
+    """
+    RandomAgent that raises once all agents have played crash_after cards, standing in for a killed process. The
+    count is on the class so it isn't snapshotted
+    """
+    crash_after = None
+
+    def getAction(self, state):
+        if CrashingAgent.crash_after is not None:
+            CrashingAgent.crash_after -= 1
+            if CrashingAgent.crash_after < 0:
+                raise KeyboardInterrupt
+        return super().getAction(state)
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def test_resumed_run_matches_uninterrupted_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            full = run_resumable(os.path.join(directory, "full"), 20, QLearningAgent(0), [RandomAgent(1)], seed=3,
+                                 snapshot_every=5)
+            resumed_directory = os.path.join(directory, "resumed")
+            run_resumable(resumed_directory, 10, QLearningAgent(0), [RandomAgent(1)], seed=3, snapshot_every=5)
+            resumed = run_resumable(resumed_directory, 20, snapshot_every=5)
+        self.assertTrue(full.q_values)
+        self.assertEqual(full.q_values, resumed.q_values)
+        self.assertEqual(full.episodes_rewards, resumed.episodes_rewards)
+
+    def test_crash_resumes_from_last_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            full_metrics = os.path.join(directory, "full.csv")
+            full_telemetry = os.path.join(directory, "full_telemetry.csv")
+            full = run_resumable(os.path.join(directory, "full"), 12,
+                                 QLearningAgent(0, telemetry=LearnerTelemetry(full_telemetry, every=2)),
+                                 [RandomAgent(1)], seed=5, snapshot_every=4, metrics_path=full_metrics)
+            crashed_directory = os.path.join(directory, "crashed")
+            crashed_metrics = os.path.join(directory, "crashed.csv")
+            crashed_telemetry = os.path.join(directory, "crashed_telemetry.csv")
+            CrashingAgent.crash_after = 26 * 6
+            try:
+                with self.assertRaises(KeyboardInterrupt):
+                    run_resumable(crashed_directory, 12,
+                                  QLearningAgent(0, telemetry=LearnerTelemetry(crashed_telemetry, every=2)),
+                                  [CrashingAgent(1)], seed=5, snapshot_every=4, metrics_path=crashed_metrics)
+            finally:
+                CrashingAgent.crash_after = None
+            self.assertEqual(4, load_snapshot(list_snapshots(crashed_directory)[-1])["episode"])
+            resumed = run_resumable(crashed_directory, 12, snapshot_every=4, metrics_path=crashed_metrics)
+            self.assertEqual(full.q_values, resumed.q_values)
+            self.assertEqual(list(iter_rows(full_metrics)), list(iter_rows(crashed_metrics)))
+            self.assertEqual(6, len(list(iter_telemetry(crashed_telemetry))))
+            self.assertEqual(list(iter_telemetry(full_telemetry)), list(iter_telemetry(crashed_telemetry)))
+
+    def test_killed_between_rows_and_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            full_metrics = os.path.join(directory, "full.csv")
+            run_resumable(os.path.join(directory, "full"), 12, QLearningAgent(0), [RandomAgent(1)], seed=5,
+                          snapshot_every=4, metrics_path=full_metrics)
+            crashed_directory = os.path.join(directory, "crashed")
+            crashed_metrics = os.path.join(directory, "crashed.csv")
+            atomic_write = checkpoint.atomic_write
+
+            def dying_write(path, data):
+                if path == checkpoint.snapshot_path(crashed_directory, 8):
+                    raise OSError("killed")
+                atomic_write(path, data)
+
+            checkpoint.atomic_write = dying_write
+            try:
+                with self.assertRaises(OSError):
+                    run_resumable(crashed_directory, 12, QLearningAgent(0), [RandomAgent(1)], seed=5,
+                                  snapshot_every=4, metrics_path=crashed_metrics)
+            finally:
+                checkpoint.atomic_write = atomic_write
+            self.assertEqual(4, load_snapshot(list_snapshots(crashed_directory)[-1])["episode"])
+            self.assertEqual(16, len(list(iter_rows(crashed_metrics))))
+            run_resumable(crashed_directory, 12, snapshot_every=4, metrics_path=crashed_metrics)
+            self.assertEqual(list(iter_rows(full_metrics)), list(iter_rows(crashed_metrics)))
+
+    def test_keeps_latest_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            run_resumable(directory, 5, QLearningAgent(0), [RandomAgent(1)], snapshot_every=1, keep=2)
+            snapshots = list_snapshots(directory)
+            self.assertEqual([4, 5], [load_snapshot(path)["episode"] for path in snapshots])
+            self.assertEqual(sorted(os.path.basename(path) for path in snapshots), sorted(os.listdir(directory)))
+
+    def test_no_snapshot_and_no_learner(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                run_resumable(directory, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
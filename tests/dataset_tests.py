@@ -0,0 +1,54 @@
+import random
+import tempfile
+import unittest
+import numpy as np
+import cards
+from agents import RandomAgent
+from dataset import RecordingSpades, ShardWriter, ShardDataset, write_dataset, play_records, RECORD_DTYPE
+
+
+class RecordingSpadesTests(unittest.TestCase):
+
+    def test_records_label_every_decision(self):
+        game = RecordingSpades([RandomAgent(0), RandomAgent(1)], simple_scoring=True, deal_seed=1)
+        game.play_spades()
+        records = game.records()
+        self.assertEqual(52, len(records))
+        self.assertEqual(cards.FULL_DECK, np.bitwise_or.reduce(np.uint64(1) << records["action"].astype(np.uint64)))
+        self.assertTrue(np.all(records["legal"] >> records["action"].astype(np.uint64) & 1))
+        self.assertTrue(np.all(records["hand"] & records["played"] == 0))
+        self.assertEqual(26 * 26, int(records["final_tricks"].sum()))
+        self.assertTrue(np.all(records["final_score"] == records["final_tricks"].astype(int) * 10))
+        self.assertEqual([-1, -1, -1], records["board"][0].tolist())
+        self.assertEqual(records["action"][0], records["board"][1][0])
+
+
+class ShardTests(unittest.TestCase):
+
+    def test_shards_split_and_append(self):
+        directory = tempfile.mkdtemp()
+        chunks = list(play_records([RandomAgent(0), RandomAgent(1)], 3, random.Random(0), games_per_chunk=2))
+        records = np.concatenate(chunks)
+        with ShardWriter(directory, shard_size=60) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        with ShardWriter(directory, shard_size=60, compress=True) as writer:
+            writer.write(records[:10])
+        dataset = ShardDataset(directory)
+        self.assertEqual(166, len(dataset))
+        self.assertEqual(records[100], dataset[100])
+        self.assertEqual(records[5], dataset[161])
+        self.assertIsInstance(dataset.shards[0], np.memmap)
+        batches = list(dataset.iter_batches(50))
+        self.assertEqual([50, 10, 50, 10, 36, 10], [len(batch) for batch in batches])
+        with self.assertRaises(IndexError):
+            dataset[166]
+
+    def test_write_dataset_with_producer_processes(self):
+        directory = tempfile.mkdtemp()
+        written = write_dataset(directory, ["random"] * 4, 5, processes=2, shard_size=100)
+        self.assertEqual(5 * 52, written)
+        dataset = ShardDataset(directory)
+        self.assertEqual(written, len(dataset))
+        self.assertEqual(RECORD_DTYPE, dataset.shards[0].dtype)
+        self.assertTrue(np.all(np.concatenate(list(dataset.iter_batches(64)))["num_players"] == 4))
@@ -0,0 +1,56 @@
+import random
+import tempfile
+import unittest
+from agents import RandomAgent, QLearningAgent, FrozenQAgent
+from evaluation import train, deal_set, evaluate_deals
+from ismcts import ISMCTSAgent
+from result_cache import ResultCache
+
+
+class EvaluateDealsTests(unittest.TestCase):
+
+    def setUp(self):
+        learner = QLearningAgent(0, q_values={})
+        train(learner, [RandomAgent(1)], 50, random.Random(0))
+        self.learner = learner
+        self.deals = deal_set(20, seed=3)
+
+    def test_cached_outcomes_match_played_games(self):
+        cache = ResultCache(tempfile.mkdtemp())
+        played = evaluate_deals(FrozenQAgent.from_agent(self.learner), [RandomAgent(1)], self.deals, 1, cache)
+        self.assertEqual(0, played["cached"])
+        replayed = evaluate_deals(FrozenQAgent.from_agent(self.learner, seed=9), [RandomAgent(1)], self.deals, 1,
+                                  cache)
+        self.assertEqual(20, replayed["cached"])
+        self.assertEqual(dict(played, cached=20), replayed)
+        uncached = evaluate_deals(FrozenQAgent.from_agent(self.learner), [RandomAgent(1)], self.deals, 1)
+        self.assertEqual(dict(played), uncached)
+
+    def test_new_deals_and_seeds_are_played(self):
+        cache = ResultCache(tempfile.mkdtemp())
+        agent = FrozenQAgent.from_agent(self.learner)
+        evaluate_deals(agent, [RandomAgent(1)], self.deals[:10], 1, cache)
+        self.assertEqual(10, evaluate_deals(agent, [RandomAgent(1)], self.deals, 1, cache)["cached"])
+        self.assertEqual(0, evaluate_deals(agent, [RandomAgent(1)], self.deals, 2, cache)["cached"])
+
+    def test_fingerprints(self):
+        self.assertEqual(FrozenQAgent.from_agent(self.learner).fingerprint(),
+                         FrozenQAgent.from_agent(self.learner, index=3, seed=4).fingerprint())
+        self.assertNotEqual(FrozenQAgent.from_agent(self.learner).fingerprint(), FrozenQAgent().fingerprint())
+        self.assertIsNone(self.learner.fingerprint())
+        self.assertIsNone(ISMCTSAgent(time_limit=1).fingerprint())
+
+    def test_agents_without_fingerprint_are_not_cached(self):
+        cache = ResultCache(tempfile.mkdtemp())
+        for repeat in range(2):
+            result = evaluate_deals(RandomAgent(1), [self.learner], self.deals[:2], 0, cache)
+            self.assertEqual(0, result["cached"])
+
+    def test_random_states_are_restored(self):
+        agent = FrozenQAgent.from_agent(self.learner, seed=5)
+        random.seed(8)
+        global_state = random.getstate()
+        agent_state = agent.random.getstate()
+        evaluate_deals(agent, [RandomAgent(1)], self.deals[:3], 1)
+        self.assertEqual(global_state, random.getstate())
+        self.assertEqual(agent_state, agent.random.getstate())
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+import events
+import spades
+from agents import QLearningAgent, RandomAgent
+
+
+class EventLogTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+
+    def play_games(self, level, num_games, **kwargs):
+        players = [QLearningAgent(1), RandomAgent(2)]
+        with events.EventLog(self.path, level=level, buffer_size=7) as log:
+            for deal_seed in range(num_games):
+                spades.Spades(players, deal_seed=deal_seed, event_log=log, **kwargs).play_spades()
+
+    def test_replay_rebuilds_games(self):
+        self.play_games(events.PLAY, 3)
+        self.play_games(events.PLAY, 2, simple_scoring=True, early_termination=True)
+        for game_id in range(5):
+            self.assertTrue(events.verify_replay(self.path, game_id))
+        replayed = events.replay(self.path, 4)
+        logged = [event for event in events.read_events(self.path, 4) if event["event"] == "score"][0]
+        self.assertEqual(logged["tricks"], [[index, tricks] for index, tricks in replayed.scores.items()])
+
+    def test_level_gating(self):
+        self.play_games(events.GAME, 2)
+        kinds = {event["event"] for event in events.read_events(self.path)}
+        self.assertEqual({"deal", "bet", "score"}, kinds)
+        self.assertEqual(2, len([event for event in events.read_events(self.path) if event["event"] == "deal"]))
@@ -1,8 +1,9 @@
+import random
 import unittest
 import sys
 sys.path.append(r"C:\Users\IANS\PycharmProjects\SpadesAI")
 import spades
-from agents import Agent, RandomAgent, QLearningAgent
+from agents import Agent, RandomAgent, QLearningAgent, FrozenQAgent
 import pyCardDeck
 from pyCardDeck import PokerCard
 
@@ -151,7 +152,7 @@ class QLearningTests(unittest.TestCase):
     def test_board_rep_empty(self):
         players = self.test_players.copy()
         new_game = spades.Spades(players)
-        actual = players[0].create_board_representation(new_game)
+        actual = players[0].create_state_rep(new_game)[:1]
         expected = ("EMPTY", )
         self.assertEqual(expected, actual)
 
@@ -159,7 +160,8 @@ class QLearningTests(unittest.TestCase):
         players = self.test_players.copy()
         new_game = spades.Spades(players)
         new_game.board[0] = pyCardDeck.PokerCard("Hearts", 2, "Two")
-        actual = players[0].create_board_representation(new_game)
+        new_game.context.place_card(new_game.board[0], 0)
+        actual = players[0].create_state_rep(new_game)[:1]
         expected = ("H2", )
         self.assertEqual(expected, actual)
 
@@ -257,3 +259,189 @@ class AgentHelperMethods(unittest.TestCase):
         self.assertEqual([], actual)
 
 
+class TrickContextTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_players = [QLearningAgent(1), RandomAgent(2)]
+        self.game = spades.Spades(self.test_players)
+
+    def test_context_follows_placed_cards(self):
+        players = self.test_players
+        lead = PokerCard("Hearts", 9, "Nine")
+        trump = PokerCard("Spades", 2, "Two")
+        players[0].hand.append(lead)
+        players[1].hand.append(trump)
+        self.game.place_card(lead, players[0], 0)
+        self.assertEqual("Hearts", self.game.context.lead_suit)
+        self.assertEqual(lead, self.game.context.winning_card)
+        self.game.place_card(trump, players[1], 1)
+        self.assertEqual(trump, self.game.context.winning_card)
+        self.assertEqual(1, self.game.context.winning_position)
+
+    def test_state_key_uses_seat_offset(self):
+        players = self.test_players
+        players[0].hand.append(PokerCard("Hearts", 9, "Nine"))
+        self.assertEqual(("EMPTY", 25, 0, "LOWEST_NON_SPADE"),
+                         players[0].create_state_action_rep(self.game, "LOWEST_NON_SPADE"))
+        self.game.context.start_trick(1)
+        self.assertEqual(1, players[0].create_state_key(self.game)[-1])
+
+class PlayedCardsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_players = [RandomAgent(1), RandomAgent(2)]
+        self.game = spades.Spades(self.test_players)
+
+    def test_off_suit_non_spade_marks_void(self):
+        players = self.test_players
+        lead = PokerCard("Hearts", 9, "Nine")
+        discard = PokerCard("Clubs", 3, "Three")
+        players[0].hand.append(lead)
+        players[1].hand.append(discard)
+        self.game.place_card(lead, players[0], 0)
+        self.game.place_card(discard, players[1], 1)
+        self.assertTrue(self.game.played.is_played(lead))
+        self.assertEqual(2, self.game.played.count())
+        self.assertEqual(["Hearts"], self.game.played.void_suits(2))
+        self.assertEqual([], self.game.played.void_suits(1))
+        self.assertFalse(self.game.played.spades_broken())
+
+    def test_leading_spade_marks_other_suits_void(self):
+        players = self.test_players
+        lead = PokerCard("Spades", 9, "Nine")
+        players[0].hand.append(lead)
+        self.game.place_card(lead, players[0], 0)
+        self.assertEqual(["Hearts", "Diamonds", "Clubs"], self.game.played.void_suits(1))
+        self.assertTrue(self.game.played.spades_broken())
+        self.assertEqual(12, self.game.played.spades_remaining())
+
+class FrozenQAgentTests(unittest.TestCase):
+
+    def test_picks_highest_valued_action(self):
+        trained = QLearningAgent(1)
+        trained.q_values = {("EMPTY", 25, 0, "HIGHEST_NON_SPADE"): 3.0, ("EMPTY", 25, 0, "LOWEST_NON_SPADE"): 1.0}
+        frozen = QLearningAgent.create_optimal_agent(1, trained)
+        game = spades.Spades([frozen, RandomAgent(2)])
+        frozen.hand = [PokerCard("Hearts", 3, "Three"), PokerCard("Clubs", "K", "King")]
+        self.assertEqual("HIGHEST_NON_SPADE", frozen.getPolicy(game))
+        self.assertEqual("King of Clubs", frozen.getAction(game).name)
+
+    def test_full_game_leaves_trained_agent_untouched(self):
+        trained = QLearningAgent(1)
+        trained.q_values = {("EMPTY", 1, 0, "LOWEST_NON_SPADE"): 2.0}
+        frozen = FrozenQAgent.from_agent(trained, seed=0)
+        game = spades.Spades([frozen, RandomAgent(2)])
+        game.play_spades()
+        self.assertEqual({("EMPTY", 1, 0, "LOWEST_NON_SPADE"): 2.0}, trained.q_values)
+        self.assertEqual(26, sum(game.scores.values()))
+
+class QLambdaTests(unittest.TestCase):
+
+    def test_end_episode_learns_final_reward(self):
+        agent = QLearningAgent(1, alpha=.5)
+        agent.last_state_key = ("S14", 25, 0)
+        agent.last_action = "HIGHEST_SPADE"
+        agent.last_reward = 100
+        agent.end_episode()
+        self.assertEqual(50, agent.q_values[("S14", 25, 0, "HIGHEST_SPADE")])
+
+    def test_traces_pass_reward_back(self):
+        agent = QLearningAgent(1, alpha=1, gamma=1, trace_decay=.5)
+        agent.learn(("EMPTY", 1, 0, "LOWEST_NON_SPADE"), 0)
+        agent.learn(("EMPTY", 1, 0, "HIGHEST_NON_SPADE"), 10)
+        self.assertEqual(10, agent.q_values[("EMPTY", 1, 0, "HIGHEST_NON_SPADE")])
+        self.assertEqual(5, agent.q_values[("EMPTY", 1, 0, "LOWEST_NON_SPADE")])
+        agent.start_episode()
+        self.assertEqual({}, agent.traces)
+
+    def test_one_step_keeps_no_traces(self):
+        agent = QLearningAgent(1, trace_decay=0)
+        game = spades.Spades([agent, RandomAgent(2)], deal_seed=1)
+        game.play_spades()
+        self.assertEqual({}, agent.traces)
+        self.assertTrue(agent.q_values)
+
+    def test_learning_game_with_traces(self):
+        agent = QLearningAgent(1, trace_decay=.8, epsilon=0)
+        game = spades.Spades([agent, RandomAgent(2)], deal_seed=2)
+        game.play_spades()
+        self.assertEqual(26, sum(game.scores.values()))
+        self.assertEqual({}, agent.traces)
+
+
+class IterPlayTests(unittest.TestCase):
+
+    def test_driver_plays_full_game(self):
+        players = [RandomAgent(1), RandomAgent(2)]
+        game = spades.Spades(players)
+        decisions = game.iter_play()
+        decision = next(decisions)
+        count = 0
+        while True:
+            count += 1
+            self.assertIs(decision.player.hand[0].__class__, decision.legal_moves[0].__class__)
+            self.assertIs(players[decision.seat], decision.player)
+            try:
+                decision = decisions.send(decision.legal_moves[0])
+            except StopIteration as end:
+                final_scores = end.value
+                break
+        self.assertEqual(52, count)
+        self.assertEqual(26, sum(game.scores.values()))
+        self.assertIs(game.final_scores, final_scores)
+
+    def test_illegal_card_rejected(self):
+        players = [RandomAgent(1), RandomAgent(2)]
+        game = spades.Spades(players)
+        decisions = game.iter_play()
+        decision = next(decisions)
+        illegal = [card for card in decision.player.hand if card not in decision.legal_moves]
+        self.assertTrue(illegal)
+        self.assertRaises(ValueError, decisions.send, illegal[0])
+
+class EarlyTerminationTests(unittest.TestCase):
+
+    def play(self, deal_seed, early_termination, simple_scoring):
+        random.seed(deal_seed)
+        players = [RandomAgent(1), RandomAgent(2)]
+        game = spades.Spades(players, deal_seed=deal_seed, early_termination=early_termination,
+                             simple_scoring=simple_scoring)
+        game.play_spades()
+        return game
+
+    def winner(self, game):
+        return max(game.final_scores, key=game.final_scores.get)
+
+    def test_same_winner_as_full_game(self):
+        skipped = 0
+        for simple_scoring in [True, False]:
+            for deal_seed in range(20):
+                full = self.play(deal_seed, False, simple_scoring)
+                early = self.play(deal_seed, True, simple_scoring)
+                self.assertEqual(self.winner(full), self.winner(early))
+                skipped += early.tricks_skipped
+                self.assertEqual([], early.players[0].hand)
+        self.assertGreater(skipped, 0)
+
+    def test_undecided_game_keeps_playing(self):
+        players = [RandomAgent(1), RandomAgent(2)]
+        game = spades.Spades(players, simple_scoring=True)
+        players[0].hand.append(PokerCard("Hearts", 2, "Two"))
+        game.scores = {1: 0, 2: 1}
+        self.assertFalse(game.outcome_decided())
+        game.scores = {1: 0, 2: 2}
+        self.assertTrue(game.outcome_decided())
+
+class TrickResolutionTests(unittest.TestCase):
+
+    def test_spade_beats_higher_lead_suit_card(self):
+        players = [RandomAgent(1), RandomAgent(2), RandomAgent(3)]
+        game = spades.Spades(players)
+        trick = [PokerCard("Hearts", 2, "Two"), PokerCard("Spades", 5, "Five"), PokerCard("Hearts", 9, "Nine")]
+        for position, card in enumerate(trick):
+            players[position].hand.append(card)
+            game.place_card(card, players[position], position)
+        self.assertEqual(trick[1], game.context.winning_card)
+        game.update_winner()
+        self.assertEqual({1: 0, 2: 1, 3: 0}, game.scores)
+        self.assertEqual((players[1], players[2], players[0]), game.get_playing_order())
@@ -0,0 +1,69 @@
+import random
+import unittest
+from agents import RandomAgent
+from evaluation import play_game
+from ismcts import NodePool, ISMCTSAgent, NO_NODE
+from spades import Spades
+
+
+class NodePoolTests(unittest.TestCase):
+
+    def test_advance_keeps_played_subtree(self):
+        pool = NodePool(10)
+        root = pool.allocate()
+        first = pool.allocate(5, 0, root)
+        pool.allocate(6, 0, root)
+        kept = pool.allocate(7, 1, first)
+        pool.allocate(8, 1, kept)
+        self.assertEqual(5, pool.in_use())
+        self.assertEqual(kept, pool.advance(root, [5, 7]))
+        self.assertEqual(2, pool.in_use())
+        self.assertEqual(NO_NODE, pool.next_sibling[kept])
+        self.assertEqual(NO_NODE, pool.advance(kept, [9]))
+        self.assertEqual(0, pool.in_use())
+
+    def test_full_pool(self):
+        pool = NodePool(1)
+        root = pool.allocate()
+        self.assertEqual(NO_NODE, pool.allocate(3, 0, root))
+
+
+class ISMCTSAgentTests(unittest.TestCase):
+
+    def test_plays_legal_games(self):
+        for num_players in [2, 4]:
+            agent = ISMCTSAgent(0, iterations=20, seed=num_players)
+            players = [agent] + [RandomAgent(index) for index in range(1, num_players)]
+            game = play_game(players, deal_seed=num_players)
+            self.assertEqual(52 // num_players, sum(game.scores.values()))
+
+    def test_reuses_tree_between_moves(self):
+        agent = ISMCTSAgent(0, iterations=50, seed=1)
+        opponent = RandomAgent(1)
+        game = Spades([agent, opponent], simple_scoring=True, deal_seed=3)
+        decisions = game.iter_play()
+        decision = next(decisions)
+        rng = random.Random(0)
+        reused = []
+        while True:
+            if decision.player is agent:
+                card = agent.getAction(game)
+                reused.append(agent.root != NO_NODE and agent.pool.visits[agent.root] > 0)
+            else:
+                card = rng.choice(decision.legal_moves)
+            try:
+                decision = decisions.send(card)
+            except StopIteration:
+                break
+        self.assertTrue(any(reused))
+
+    def test_small_pool_still_plays(self):
+        agent = ISMCTSAgent(0, iterations=30, capacity=8, seed=2)
+        game = play_game([agent, RandomAgent(1)], deal_seed=4)
+        self.assertEqual(26, sum(game.scores.values()))
+
+    def test_plays_without_search_budget(self):
+        for agent in [ISMCTSAgent(0, time_limit=0, seed=1), ISMCTSAgent(0, iterations=0, seed=1),
+                      ISMCTSAgent(0, iterations=5, capacity=1, seed=1)]:
+            game = play_game([agent, RandomAgent(1)], deal_seed=5)
+            self.assertEqual(26, sum(game.scores.values()))
@@ -0,0 +1,86 @@
+import os
+import random
+import tempfile
+import unittest
+import metrics
+from agents import QLearningAgent, RandomAgent
+from evaluation import train
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), "metrics.csv")
+
+    def test_training_rows_are_streamed_back(self):
+        with metrics.MetricsWriter(self.path, chunk_size=3) as writer:
+            train(QLearningAgent(0), [RandomAgent(1)], 4, random.Random(0), metrics=writer)
+        rows = list(metrics.iter_rows(self.path, player=0))
+        self.assertEqual([0, 1, 2, 3], [row["episode"] for row in rows])
+        self.assertEqual(4, len(list(metrics.iter_rows(self.path, player=1))))
+        for row in metrics.iter_rows(self.path):
+            self.assertEqual(13, row["bet"])
+
+    def test_rolling_mean_and_downsample(self):
+        writer = metrics.MetricsWriter(self.path)
+        writer.rows = [(episode, 0, float(episode), 0, 0, 13, 0) for episode in range(10)]
+        writer.close()
+        rolling = list(metrics.rolling_mean(self.path, window=4, every=3))
+        self.assertEqual([(0, 0.0), (3, 1.5), (6, 4.5), (9, 7.5)], rolling)
+        self.assertEqual([(0, 1.5), (4, 5.5), (8, 8.5)], metrics.downsample(self.path, bucket=4))
+        self.assertEqual(10, metrics.MetricsWriter(self.path).episode)
+
+    def test_plot_every_without_counting_rows(self):
+        writer = metrics.MetricsWriter(self.path)
+        self.assertEqual(1, metrics.plot_every(self.path, max_points=4))
+        writer.rows = [(episode, player, 0.0, 0, 0, 13, 0) for episode in range(10) for player in range(2)]
+        writer.close()
+        self.assertEqual(5, metrics.plot_every(self.path, max_points=4))
+        self.assertEqual(2, metrics.plot_every(self.path, player=0, max_points=4))
+
+
+class LearnerTelemetryTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), "telemetry.csv")
+
+    def test_rows_every_n_episodes(self):
+        learner = QLearningAgent(0, epsilon=.5, telemetry=metrics.LearnerTelemetry(self.path, every=5))
+        train(learner, [RandomAgent(1)], 12, random.Random(0))
+        rows = list(metrics.iter_telemetry(self.path))
+        self.assertEqual([5, 10], [row["episode"] for row in rows])
+        for row in rows:
+            self.assertEqual(5 * 26, row["explored"] + row["exploited"])
+            self.assertEqual(5 * 26, sum(row[action] for action in QLearningAgent.reward_multipliers))
+            self.assertEqual(5 * 26, row["updates"])
+            self.assertGreater(row["lookups"], 0)
+            self.assertTrue(0 <= row["hit_rate"] <= 1)
+            self.assertGreater(row["mean_abs_td_error"], 0)
+        self.assertGreater(rows[1]["hit_rate"], 0)
+        self.assertLessEqual(rows[0]["states_seen"], rows[1]["states_seen"])
+        self.assertLessEqual(rows[1]["states_seen"], len(learner.telemetry.state_visits))
+        self.assertEqual(12 * 26, sum(visits for state, visits in learner.telemetry.state_visits.items()))
+
+    def test_lookups_counted_once_per_decision(self):
+        learner = QLearningAgent(0, epsilon=0, telemetry=metrics.LearnerTelemetry(self.path, every=5))
+        legal_actions = []
+        get_action = learner.getAction
+
+        def counting_get_action(state):
+            legal_actions.append(len(learner.getLegalActions(state)))
+            return get_action(state)
+        learner.getAction = counting_get_action
+        train(learner, [RandomAgent(1)], 10, random.Random(0))
+        self.assertEqual(sum(legal_actions), sum(row["lookups"] for row in metrics.iter_telemetry(self.path)))
+
+    def test_resumed_file_continues_episodes(self):
+        learner = QLearningAgent(0, telemetry=metrics.LearnerTelemetry(self.path, every=2))
+        train(learner, [RandomAgent(1)], 2, random.Random(0))
+        learner.telemetry = metrics.LearnerTelemetry(self.path, every=2)
+        train(learner, [RandomAgent(1)], 2, random.Random(1))
+        self.assertEqual([2, 4], [row["episode"] for row in metrics.iter_telemetry(self.path)])
+
+    def test_no_telemetry_by_default(self):
+        learner = QLearningAgent(0)
+        train(learner, [RandomAgent(1)], 1, random.Random(0))
+        self.assertIsNone(learner.telemetry)
@@ -0,0 +1,31 @@
+import tempfile
+import unittest
+import result_cache
+import sweep
+
+
+class SweepTests(unittest.TestCase):
+
+    def test_grid_and_random_search(self):
+        configs = sweep.grid({"alpha": [.2, .4], "epsilon": [0, .1]})
+        self.assertEqual(4, len(configs))
+        self.assertIn({"alpha": .4, "epsilon": 0}, configs)
+        drawn = sweep.random_search({"alpha": (0.1, 0.5), "gamma": [1]}, 3, seed=2)
+        self.assertEqual(drawn, sweep.random_search({"alpha": (0.1, 0.5), "gamma": [1]}, 3, seed=2))
+        self.assertTrue(all(0.1 <= config["alpha"] <= 0.5 for config in drawn))
+
+    def test_rerun_is_served_from_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        configs = [{"alpha": .4, "LOWEST_SAME_SUIT_WIN": 2}]
+        first = sweep.run_sweep(configs, train_games=2, eval_games=2, cache_dir=cache_dir, processes=1)
+        self.assertEqual(1, len(first))
+        self.assertEqual(2, first[0]["games"])
+        second = sweep.run_sweep(configs, train_games=2, eval_games=2, cache_dir=cache_dir, processes=1)
+        self.assertEqual(first, second)
+
+    def test_code_version_covers_sweep(self):
+        self.assertNotEqual(result_cache.code_version(), result_cache.code_version("sweep.py"))
+        self.assertEqual(result_cache.code_version("sweep.py"), result_cache.code_version("sweep.py"))
+
+    def test_unknown_parameter(self):
+        self.assertRaises(ValueError, sweep.run_config, {"beta": 1}, 1, 1, 0)
@@ -0,0 +1,84 @@
+import random
+import tempfile
+import unittest
+import cards
+import spades
+import tablebase
+from agents import RandomAgent
+
+
+def brute_force(masks, trick, num_players):
+    """
+    Max^n value of a position without any table or card compression, for checking the tablebase
+    """
+    seat = len(trick)
+    if seat == num_players:
+        winner = cards.trick_winner(trick)
+        rotated = [masks[(winner + offset) % num_players] for offset in range(num_players)]
+        if rotated[0] == 0:
+            future = (0,) * num_players
+        else:
+            future = brute_force(rotated, [], num_players)
+        return tuple(future[(player - winner) % num_players] + (player == winner) for player in range(num_players))
+    lead_suit = trick[0] // 13 if trick else None
+    best = None
+    for card in cards.legal_card_ids(cards.mask_to_ids(masks[seat]), lead_suit):
+        next_masks = list(masks)
+        next_masks[seat] ^= 1 << card
+        value = brute_force(next_masks, trick + [card], num_players)
+        if best is None or tablebase.preference(value, seat) > tablebase.preference(best, seat):
+            best = value
+    return best
+
+
+class TablebaseTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.mkdtemp()
+        cls.tablebase = tablebase.generate(cls.directory, 2, 3)
+        cls.four_player_tablebase = tablebase.generate(cls.directory, 4, 2)
+
+    def random_masks(self, rng, num_players, num_cards):
+        deck = list(range(52))
+        rng.shuffle(deck)
+        return [sum(1 << card for card in deck[seat * num_cards:(seat + 1) * num_cards]) for seat in range(num_players)]
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for i in range(200):
+            masks = self.random_masks(rng, 2, rng.randint(1, 3))
+            self.assertEqual(brute_force(masks, [], 2), self.tablebase.value(masks))
+
+    def test_four_players_match_brute_force(self):
+        rng = random.Random(3)
+        for i in range(300):
+            masks = self.random_masks(rng, 4, rng.randint(1, 2))
+            self.assertEqual(brute_force(masks, [], 4), self.four_player_tablebase.value(masks))
+
+    def test_index_is_dense(self):
+        sequences = tablebase.owner_sequences([2, 2, 2, 2])
+        self.assertEqual(list(range(2520)), [tablebase.sequence_index(sequence, 4, 2) for sequence in sequences])
+        for table in list(self.tablebase.tables.values()) + list(self.four_player_tablebase.tables.values()):
+            self.assertFalse((table == tablebase.UNSOLVED).any())
+        self.assertEqual(len(tablebase.compositions(6)) * 20, len(self.tablebase.tables[3]))
+        self.assertIn((2, 2, 1, 1), tablebase.compositions(6))
+        self.assertNotIn((2, 1, 2, 1), tablebase.compositions(6))
+
+    def test_load_is_memory_mapped(self):
+        loaded = tablebase.Tablebase.load(self.directory, 2)
+        self.assertEqual(3, loaded.max_cards())
+        self.assertEqual("r", loaded.tables[3].mode)
+
+    def test_lookup_from_live_game(self):
+        players = [RandomAgent(1), RandomAgent(2)]
+        game = spades.Spades(players)
+        rng = random.Random(11)
+        masks = self.random_masks(rng, 2, 3)
+        for player, mask in zip(players, masks):
+            player.hand = [spades.Spades.create_card(cards.SUITS[card // 13], card % 13 + 2) for card in
+                           cards.mask_to_ids(mask)]
+        expected = brute_force(masks, [], 2)
+        self.assertEqual({1: expected[0], 2: expected[1]}, self.tablebase.tricks_remaining(game))
+        card = self.tablebase.best_card(game, players[0])
+        self.assertIn(card, game.get_legal_moves(players[0]))
@@ -0,0 +1,49 @@
+import os
+import pickle
+import tempfile
+import unittest
+import result_cache
+import tournament
+from agents import QLearningAgent
+
+
+class TournamentTests(unittest.TestCase):
+
+    def test_elo_orders_by_results(self):
+        results = [(["a", "b"], {"games": 10, "scores": [[0, 9], [1, 0]]}),
+                   (["b", "c"], {"games": 10, "scores": [[0, 7], [3, 0]]})]
+        ratings = tournament.elo_ratings(["a", "b", "c"], results)
+        self.assertGreater(ratings["a"], ratings["b"])
+        self.assertGreater(ratings["b"], ratings["c"])
+        self.assertAlmostEqual(1500, sum(ratings.values()) / 3)
+
+    def test_entrants_keyed_by_path(self):
+        self.assertNotEqual(tournament.entrant_name(os.path.join("run1", "agent.p")),
+                            tournament.entrant_name(os.path.join("run2", "agent.p")))
+        with self.assertRaises(ValueError):
+            tournament.run_tournament([os.path.join("run1", "agent.p"), os.path.join(".", "run1", "agent.p")])
+        with self.assertRaises(ValueError):
+            tournament.elo_ratings(["a", "a"], [])
+
+    def test_code_version_covers_tournament(self):
+        self.assertNotEqual(result_cache.code_version(), result_cache.code_version("tournament.py"))
+
+    def test_new_checkpoint_only_plays_new_matches(self):
+        directory = tempfile.mkdtemp()
+        cache_dir = os.path.join(directory, "cache")
+        paths = []
+        for name in ["first.p", "second.p"]:
+            agent = QLearningAgent(0)
+            agent.q_values = {("EMPTY", 1, 0, "HIGHEST_NON_SPADE"): len(paths) + 1.0}
+            paths.append(os.path.join(directory, name))
+            with open(paths[-1], "wb") as f:
+                pickle.dump(agent, f)
+        ratings, results = tournament.run_tournament(paths[:1] + ["random"], num_games=2, cache_dir=cache_dir,
+                                                     processes=1)
+        self.assertEqual({paths[0], "random"}, set(ratings))
+        cached_files = sum(len(files) for root, dirs, files in os.walk(cache_dir))
+        self.assertEqual(1, cached_files)
+        ratings, results = tournament.run_tournament(paths + ["random"], num_games=2, cache_dir=cache_dir,
+                                                     processes=1)
+        self.assertEqual(3, len(results))
+        self.assertEqual(3, sum(len(files) for root, dirs, files in os.walk(cache_dir)))
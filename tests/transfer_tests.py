@@ -0,0 +1,33 @@
+import unittest
+from agents import QLearningAgent, RandomAgent
+from spades import Spades
+from transfer import map_seat_offset, transfer_q_values, warm_start
+
+
+class TransferTests(unittest.TestCase):
+
+    def test_seat_offsets(self):
+        self.assertEqual([0, 1, 1, 1], [map_seat_offset(offset, 2, 4) for offset in range(4)])
+        self.assertEqual([0, 3], [map_seat_offset(offset, 4, 2) for offset in range(2)])
+        self.assertEqual([0, 1, 2], [map_seat_offset(offset, 3, 3) for offset in range(3)])
+
+    def test_two_to_four_players(self):
+        q_values = {("EMPTY", 25, 0, "LOWEST_NON_SPADE"): 10.0, ("NS7", 1, 1, "LOWEST_SAME_SUIT_WIN"): 4.0}
+        transferred = transfer_q_values(q_values, 2, 4)
+        self.assertEqual({("EMPTY", 25, 0, "LOWEST_NON_SPADE"): 5.0, ("NS7", 1, 1, "LOWEST_SAME_SUIT_WIN"): 2.0,
+                          ("NS7", 1, 2, "LOWEST_SAME_SUIT_WIN"): 2.0, ("NS7", 1, 3, "LOWEST_SAME_SUIT_WIN"): 2.0},
+                         transferred)
+
+    def test_four_to_two_players_keeps_last_seat(self):
+        q_values = {("S3", 50, 1, "HIGHEST_SPADE"): 1.0, ("S3", 50, 3, "HIGHEST_SPADE"): 8.0}
+        self.assertEqual({("S3", 50, 1, "HIGHEST_SPADE"): 8.0}, transfer_q_values(q_values, 4, 2, scale=1))
+
+    def test_warm_started_agent_plays_four_players(self):
+        trained = QLearningAgent(0)
+        Spades([trained, RandomAgent(1)], deal_seed=1).play_spades()
+        agent = warm_start(trained, 2, 4, epsilon=0)
+        self.assertEqual(0, agent.epsilon)
+        self.assertTrue(agent.q_values)
+        game = Spades([agent] + [RandomAgent(index) for index in range(1, 4)], deal_seed=2)
+        game.play_spades()
+        self.assertEqual(13, sum(game.scores.values()))
@@ -0,0 +1,100 @@
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+import unittest
+import work_queue
+from agents import QLearningAgent, RandomAgent
+from evaluation import train
+from work_queue import Broker
+
+
+class BrokerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "queue.db")
+
+    def test_expired_lease_is_reissued(self):
+        broker = Broker(self.path, lease_seconds=0.2)
+        job_id = broker.submit("evaluate", {"agent": "random", "games": 1})
+        self.assertEqual(job_id, broker.lease("dead")[0])
+        self.assertIsNone(broker.lease("alive"))
+        time.sleep(0.3)
+        self.assertEqual(job_id, broker.lease("alive")[0])
+        self.assertFalse(broker.renew(job_id, "dead"))
+        self.assertTrue(broker.renew(job_id, "alive"))
+        self.assertTrue(broker.complete(job_id, "alive", {"wins": 1}))
+        self.assertFalse(broker.complete(job_id, "dead", {"wins": 0}))
+        self.assertEqual({job_id: {"wins": 1}}, broker.results([job_id]))
+
+    def test_failing_job_stops_after_max_attempts(self):
+        broker = Broker(self.path, max_attempts=2)
+        failing = broker.submit("evaluate", {"agent": os.path.join(os.path.dirname(self.path), "missing.p")})
+        working = broker.submit("evaluate", {"agent": "random", "games": 2})
+        self.assertEqual(1, work_queue.run_worker(broker, "worker", poll_seconds=0.01, idle_timeout=0))
+        self.assertEqual({"done": 1, "failed": 1}, broker.counts())
+        self.assertIn("FileNotFoundError", broker.errors([failing])[failing])
+        self.assertEqual(2, broker.results([working])[working]["games"])
+        with self.assertRaises(RuntimeError):
+            work_queue.wait_for(broker, [failing, working], poll_seconds=0.01)
+
+    def test_expired_last_attempt_fails(self):
+        broker = Broker(self.path, lease_seconds=0.1, max_attempts=1)
+        job_id = broker.submit("evaluate", {"agent": "random", "games": 1})
+        broker.lease("dead")
+        time.sleep(0.2)
+        self.assertIsNone(broker.lease("alive"))
+        self.assertEqual({"failed": 1}, broker.counts())
+        self.assertEqual({job_id: "lease expired"}, broker.errors([job_id]))
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            Broker(self.path).submit("nothing", {})
+
+    def test_worker_runs_evaluation_batches(self):
+        broker = Broker(self.path)
+        job_ids = work_queue.submit_evaluation(broker, "random", 25, batch_size=10)
+        self.assertEqual(3, work_queue.run_worker(broker, "worker", poll_seconds=0.01, idle_timeout=0))
+        result = work_queue.combine_evaluations(work_queue.wait_for(broker, job_ids))
+        self.assertEqual(25, result["games"])
+        self.assertAlmostEqual(result["wins"] / 25, result["win_rate"])
+        self.assertEqual({"done": 3}, broker.counts())
+
+    def test_evaluation_batch_is_repeatable(self):
+        agent_path = os.path.join(os.path.dirname(self.path), "agent.p")
+        agent = QLearningAgent(0)
+        train(agent, [RandomAgent(1)], 20, random.Random(0))
+        with open(agent_path, "wb") as f:
+            pickle.dump(agent, f)
+        for spec in ["random", agent_path]:
+            results = [work_queue.evaluate_batch(spec, games=20, seed=7) for run in range(3)]
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(results[0], results[2])
+
+    def test_checkpoint_is_sent_through_broker(self):
+        directory = os.path.dirname(self.path)
+        agent_path = os.path.join(directory, "agent.p")
+        with open(agent_path, "wb") as f:
+            pickle.dump(QLearningAgent(0), f)
+        broker = Broker(self.path)
+        with self.assertRaises(FileNotFoundError):
+            work_queue.submit_evaluation(broker, os.path.join(directory, "missing.p"), 4)
+        job_ids = work_queue.submit_evaluation(broker, agent_path, 4, batch_size=2)
+        os.remove(agent_path)
+        blob_dir = os.path.join(directory, "blobs")
+        self.assertEqual(2, work_queue.run_worker(broker, poll_seconds=0.01, idle_timeout=0, blob_dir=blob_dir))
+        self.assertEqual(4, work_queue.combine_evaluations(work_queue.wait_for(broker, job_ids))["games"])
+        self.assertEqual(1, len(os.listdir(blob_dir)))
+
+    def test_tcp_broker(self):
+        server = work_queue.broker_server(self.path, b"secret", port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        address = "127.0.0.1:%d" % server.address[1]
+        with self.assertRaises(ValueError):
+            work_queue.open_broker(address)
+        broker = work_queue.open_broker(address, b"secret")
+        job_ids = work_queue.submit_evaluation(broker, "random", 4, batch_size=2)
+        self.assertEqual(2, work_queue.run_worker(broker, poll_seconds=0.01, idle_timeout=0))
+        self.assertEqual(4, work_queue.combine_evaluations(work_queue.wait_for(broker, job_ids))["games"])
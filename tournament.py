@@ -0,0 +1,168 @@
+"""
+Round robin tournaments between pickled agent checkpoints, rated on the Elo scale.
+Workers load every checkpoint once, then play pairings (or 4 player tables) with frozen greedy policies. Finished
+matches are cached by the content of the checkpoints involved, so adding a checkpoint only plays its new matches
+"""
+import copy
+import hashlib
+import itertools
+import math
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from agents import RandomAgent, QLearningAgent, FrozenQAgent
+from evaluation import play_game
+from result_cache import ResultCache, hash_key, code_version
+
+RANDOM_AGENT = "random"
+_entrants = {}
+
+
+def entrant_name(spec):
+    """
+    :return: the name an entrant is rated under, its normalized checkpoint path, so checkpoints of the same file name
+        in different runs stay apart
+    """
+    return spec if spec == RANDOM_AGENT else os.path.normpath(spec)
+
+
+def check_unique(names):
+    duplicates = sorted(name for name in set(names) if names.count(name) > 1)
+    if duplicates:
+        raise ValueError("Entrants entered more than once: " + ", ".join(duplicates))
+
+
+def fingerprint(spec):
+    """
+    :param spec: checkpoint path or "random"
+    :return: hash of the checkpoint's content
+    """
+    if spec == RANDOM_AGENT:
+        return RANDOM_AGENT
+    digest = hashlib.sha256()
+    with open(spec, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_entrant(spec):
+    """
+    :return: agent ready to be seated, trained Q learning agents are frozen to their greedy policy
+    """
+    if spec == RANDOM_AGENT:
+        return RandomAgent()
+    with open(spec, "rb") as f:
+        agent = pickle.load(f)
+    if isinstance(agent, QLearningAgent) and not isinstance(agent, FrozenQAgent):
+        agent = FrozenQAgent.from_agent(agent)
+    return agent
+
+
+def load_entrants(specs):
+    """
+    Process pool initializer, so each worker unpickles every checkpoint once
+    """
+    for spec in specs:
+        _entrants[spec] = load_entrant(spec)
+
+
+def seat(spec, index, seed):
+    agent = copy.copy(_entrants[spec])
+    agent.index = index
+    agent.hand = []
+    if isinstance(agent, FrozenQAgent):
+        agent.random = random.Random(seed)
+    return agent
+
+
+def play_match(specs, num_games, seed):
+    """
+    Play num_games games between the entrants in specs with shuffled seating and deals
+    :return: dict with games and pairwise scores, scores[i][j] being entrant i's points against entrant j where
+        taking more tricks scores 1 and equal tricks score .5
+    """
+    random.seed(seed)
+    rng = random.Random(seed)
+    agents = [seat(spec, index, seed) for index, spec in enumerate(specs)]
+    scores = [[0.0] * len(specs) for spec in specs]
+    for game_number in range(num_games):
+        playing_order = list(agents)
+        rng.shuffle(playing_order)
+        game = play_game(playing_order, deal_seed=rng.randrange(2 ** 32))
+        for i, j in itertools.permutations(range(len(specs)), 2):
+            if game.scores[i] > game.scores[j]:
+                scores[i][j] += 1
+            elif game.scores[i] == game.scores[j]:
+                scores[i][j] += .5
+    return {"games": num_games, "scores": scores}
+
+
+def elo_ratings(names, results, iterations=500):
+    """
+    Fit Bradley-Terry strengths to the pairwise results and express them on the Elo scale, averaging 1500.
+    Each pairing gets one extra drawn game as a prior so unbeaten or winless entrants still get finite ratings
+    :param results: list of (list of names at the table, match result from play_match)
+    :return: dict of name to rating
+    """
+    check_unique(list(names))
+    points = {name: {} for name in names}
+    for table, result in results:
+        for i, j in itertools.permutations(range(len(table)), 2):
+            points[table[i]][table[j]] = points[table[i]].get(table[j], .5) + result["scores"][i][j]
+    games = {name: {} for name in names}
+    for name in names:
+        for opponent, won in points[name].items():
+            games[name][opponent] = won + points[opponent][name]
+    strength = {name: 1.0 for name in names}
+    for iteration in range(iterations):
+        updated = {}
+        for name in names:
+            denominator = sum(count / (strength[name] + strength[opponent])
+                              for opponent, count in games[name].items())
+            won = sum(points[name].values())
+            updated[name] = won / denominator if denominator else strength[name]
+        mean_log = sum(math.log(value) for value in updated.values()) / len(updated)
+        strength = {name: value / math.exp(mean_log) for name, value in updated.items()}
+    return {name: 1500 + 400 * math.log10(value) for name, value in strength.items()}
+
+
+def run_tournament(specs, num_games=100, table_size=2, seed=0, cache_dir="tournaments", processes=None):
+    """
+    :param specs: checkpoint paths, or "random" for a RandomAgent
+    :param num_games: games per pairing or table
+    :param table_size: 2 for heads up pairings, 4 for every 4 player table
+    :return: (dict of entrant name to rating, list of (table names, match result))
+    """
+    names = [entrant_name(spec) for spec in specs]
+    check_unique(names)
+    cache = ResultCache(cache_dir)
+    version = code_version("tournament.py")
+    fingerprints = {spec: fingerprint(spec) for spec in specs}
+    results = []
+    pending = []
+    for table in itertools.combinations(specs, table_size):
+        key = hash_key([fingerprints[spec] for spec in table], num_games, seed, version)
+        cached = cache.get(key)
+        if cached is not None:
+            results.append(([entrant_name(spec) for spec in table], cached))
+        else:
+            pending.append((key, table))
+    if pending:
+        with ProcessPoolExecutor(processes, initializer=load_entrants, initargs=(specs,)) as pool:
+            futures = {pool.submit(play_match, table, num_games, seed): (key, table) for key, table in pending}
+            for future in as_completed(futures):
+                key, table = futures[future]
+                result = future.result()
+                cache.put(key, result)
+                results.append(([entrant_name(spec) for spec in table], result))
+    ratings = elo_ratings(names, results)
+    return ratings, results
+
+
+if __name__ == "__main__":
+    import sys
+    tournament_ratings = run_tournament(sys.argv[1:] + [RANDOM_AGENT])[0]
+    for name in sorted(tournament_ratings, key=tournament_ratings.get, reverse=True):
+        print(round(tournament_ratings[name]), name)
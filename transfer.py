@@ -0,0 +1,44 @@
+"""
+Warm starting Q tables across player counts. A QLearningAgent key is (board, turns bucket, seat offset, action). The
+board and the turns bucket, a fraction of the hand left, mean the same thing at any table size, so only the seat
+offset has to be mapped: the leader stays the leader and every other seat takes the values of the source seat at the
+same point in the trick, the last to play keeping the last. Values are scaled by the ratio of hand sizes, as a Q value
+sums the rewards of the tricks left
+"""
+from agents import QLearningAgent
+
+
+def map_seat_offset(offset, source_players, target_players):
+    """
+    :return: seat offset in a source_players trick matching offset in a target_players trick
+    """
+    if offset == 0:
+        return 0
+    return max(1, round(offset * (source_players - 1) / (target_players - 1)))
+
+
+def transfer_q_values(q_values, source_players, target_players, scale=None):
+    """
+    :param q_values: Q table learnt with source_players players
+    :param scale: factor applied to every value, defaults to the ratio of cards per player
+    :return: new Q table for target_players players
+    """
+    if scale is None:
+        scale = source_players / target_players
+    source_offsets = [map_seat_offset(offset, source_players, target_players) for offset in range(target_players)]
+    transferred = {}
+    for (board, turns, offset, action), value in q_values.items():
+        for target_offset, source_offset in enumerate(source_offsets):
+            if source_offset == offset:
+                transferred[(board, turns, target_offset, action)] = value * scale
+    return transferred
+
+
+def warm_start(trained_agent, source_players, target_players, index=0, scale=None, **kwargs):
+    """
+    :param kwargs: QLearningAgent parameters for the new agent
+    :return: QLearningAgent for target_players players starting from trained_agent's Q table
+    """
+    agent = QLearningAgent(index, **kwargs)
+    agent.q_values = transfer_q_values(trained_agent.q_values, source_players, target_players, scale)
+    return agent
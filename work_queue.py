@@ -0,0 +1,413 @@
+"""
+Job queue for spreading evaluation and training batches over several hosts without any external service.
+
+The Broker keeps jobs in a SQLite file. Workers lease a job, keep the lease alive while running it and send back its
+result. A job whose lease runs out, because its worker died or lost its connection, goes back to the queue and is
+handed to the next worker that asks, as is a job that raised. After max_attempts tries a job is marked failed with its
+error instead. Workers on the broker's host, or sharing its file system, can open the SQLite file directly. Other
+hosts connect to serve_broker over TCP:
+
+    python cli.py broker queue.db --host 0.0.0.0 --port 5000 --authkey SECRET
+    python cli.py worker queue.db                                  # same host
+    python cli.py worker broker-host:5000 --authkey SECRET         # any other host
+
+Jobs are a kind from JOB_KINDS and JSON payload, so results can be aggregated by whoever submitted them. Files a job
+needs, such as the checkpoint of an evaluation, are stored in the broker once, keyed by the SHA-256 of their content,
+and referenced from the payload as {"blob": digest}. Workers fetch them through the broker and cache them locally, so
+they need no file system shared with the submitter.
+
+The TCP broker is a multiprocessing manager, which exchanges pickles, so anyone who can connect with the authkey can
+run arbitrary code on the broker host and on its workers. Only serve it on a network where every host is trusted and
+use a secret authkey. It listens on 127.0.0.1 unless given another host, and there is no default authkey.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def evaluate_batch(agent, num_players=2, games=100, seed=0, early_termination=False):
+    """
+    Play games between the agent checkpoint and RandomAgents, see evaluation.evaluate. The seating, the deals and every
+    agent's random choices are drawn from seed, so the result only depends on the payload
+    :param agent: checkpoint path or "random", as for tournament.load_entrant. Paths are on the worker, see
+        submit_evaluation for sending a checkpoint with the job
+    """
+    import random
+    from agents import RandomAgent
+    from evaluation import evaluate
+    from tournament import load_entrant
+    player = load_entrant(agent)
+    player.index = 0
+    player.hand = []
+    opponents = [RandomAgent(index) for index in range(1, num_players)]
+    random.seed(seed)
+    for seated in [player] + opponents:
+        if isinstance(getattr(seated, "random", None), random.Random):
+            seated.random.seed(seed)
+    return evaluate(player, opponents, games, random.Random(seed), early_termination=early_termination)
+
+
+def sweep_batch(config, train_games, eval_games, seed):
+    from sweep import run_config
+    return run_config(config, train_games, eval_games, seed)
+
+
+JOB_KINDS = {"evaluate": evaluate_batch, "sweep": sweep_batch}
+
+
+class Broker:
+    """
+    SQLite backed job queue. Every call opens its own connection, so one Broker can be shared by threads and any
+    number of processes can use the same file
+    """
+
+    def __init__(self, path, lease_seconds=60, max_attempts=3):
+        """
+        :param lease_seconds: how long a worker holds a job without renewing it before it is handed out again
+        :param max_attempts: times a job is handed out before it is marked failed
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self.connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, kind TEXT, payload TEXT, "
+                               "status TEXT, worker TEXT, lease_expires REAL, attempts INTEGER, result TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+            connection.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, data BLOB)")
+        connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get_lease_seconds(self):
+        return self.lease_seconds
+
+    def put_blob(self, data) -> str:
+        """
+        Store bytes for jobs to reference, once however often they are put
+        :return: SHA-256 hex digest of data
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        connection = self.connect()
+        try:
+            connection.execute("INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)", (digest, data))
+            return digest
+        finally:
+            connection.close()
+
+    def get_blob(self, digest):
+        """
+        :return: the bytes stored under digest, None if there are none
+        """
+        connection = self.connect()
+        try:
+            row = connection.execute("SELECT data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            return None if row is None else bytes(row[0])
+        finally:
+            connection.close()
+
+    def submit(self, kind, payload):
+        """
+        :param kind: key of JOB_KINDS
+        :param payload: dict of keyword arguments for the job
+        :return: job id
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError("Unknown job kind " + kind)
+        connection = self.connect()
+        try:
+            cursor = connection.execute("INSERT INTO jobs (kind, payload, status, attempts) VALUES (?, ?, ?, 0)",
+                                        (kind, json.dumps(payload), PENDING))
+            return cursor.lastrowid
+        finally:
+            connection.close()
+
+    def lease(self, worker):
+        """
+        Hand out the oldest pending job, or the oldest job whose lease ran out. Jobs whose lease ran out on their last
+        attempt are marked failed
+        :return: (job id, kind, payload) or None if there is nothing to do
+        """
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("UPDATE jobs SET status = ?, result = ? WHERE status = ? AND lease_expires < ? AND "
+                               "attempts >= ?", (FAILED, json.dumps("lease expired"), LEASED, now, self.max_attempts))
+            row = connection.execute("SELECT id, kind, payload FROM jobs WHERE status = ? OR "
+                                     "(status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                                     (PENDING, LEASED, now)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, "
+                                   "attempts = attempts + 1 WHERE id = ?",
+                                   (LEASED, worker, now + self.lease_seconds, row[0]))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def renew(self, job_id, worker) -> bool:
+        """
+        :return: False if the lease was lost, i.e. the job was handed to another worker or is done
+        """
+        connection = self.connect()
+        try:
+            cursor = connection.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = ? AND worker = ?",
+                                        (time.time() + self.lease_seconds, job_id, LEASED, worker))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def complete(self, job_id, worker, result) -> bool:
+        """
+        Store a job's result. A result arriving after the job was re-issued is still accepted if nobody finished it
+        first, since every run of a job gives the same result
+        :return: False if the job was already done
+        """
+        connection = self.connect()
+        try:
+            cursor = connection.execute("UPDATE jobs SET status = ?, worker = ?, result = ? "
+                                        "WHERE id = ? AND status != ?",
+                                        (DONE, worker, json.dumps(result), job_id, DONE))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def fail(self, job_id, worker, error) -> bool:
+        """
+        Record that a job raised. It goes back to the queue unless it has used all its attempts, then it is failed
+        :param error: description of the error, stored as the job's result
+        :return: False if the job was already done or handed to another worker
+        """
+        connection = self.connect()
+        try:
+            cursor = connection.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                                        "result = ?, lease_expires = NULL WHERE id = ? AND status = ? AND worker = ?",
+                                        (self.max_attempts, FAILED, PENDING, json.dumps(error), job_id, LEASED,
+                                         worker))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def results(self, job_ids):
+        """
+        :return: dict of job id to result for the jobs in job_ids that are done
+        """
+        return self.select_results(job_ids, DONE)
+
+    def errors(self, job_ids):
+        """
+        :return: dict of job id to error for the jobs in job_ids that failed
+        """
+        return self.select_results(job_ids, FAILED)
+
+    def select_results(self, job_ids, status):
+        job_ids = list(job_ids)
+        connection = self.connect()
+        try:
+            selected = {}
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                query = "SELECT id, result FROM jobs WHERE status = ? AND id IN (%s)" % ", ".join("?" * len(chunk))
+                for job_id, result in connection.execute(query, [status] + chunk):
+                    selected[job_id] = json.loads(result)
+            return selected
+        finally:
+            connection.close()
+
+    def counts(self):
+        """
+        :return: dict of status to number of jobs
+        """
+        connection = self.connect()
+        try:
+            return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            connection.close()
+
+
+def parse_address(address):
+    """
+    :return: (host, port) for "host:port", None for anything else, which is taken to be a SQLite file
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and not os.path.exists(address):
+        return host, int(port)
+    return None
+
+
+def manager_class():
+    from multiprocessing.managers import BaseManager
+
+    class BrokerManager(BaseManager):
+        pass
+    return BrokerManager
+
+
+def broker_server(path, authkey, host="127.0.0.1", port=5000, lease_seconds=60, max_attempts=3):
+    """
+    :param authkey: bytes shared with the workers, see the module docstring
+    :param host: interface to listen on, "" or "0.0.0.0" for all of them
+    :param port: 0 to pick a free port, see the server's address
+    :return: multiprocessing.managers.Server sharing the Broker on path
+    """
+    broker = Broker(path, lease_seconds, max_attempts)
+    manager = manager_class()
+    manager.register("broker", callable=lambda: broker)
+    return manager(address=(host, port), authkey=authkey).get_server()
+
+
+def serve_broker(path, authkey, host="127.0.0.1", port=5000, lease_seconds=60, max_attempts=3):
+    """
+    Serve the Broker on path over TCP until interrupted
+    """
+    broker_server(path, authkey, host, port, lease_seconds, max_attempts).serve_forever()
+
+
+def open_broker(address, authkey=None):
+    """
+    :param address: "host:port" of a serve_broker, or path of a SQLite file
+    :param authkey: the broker's authkey, only needed over TCP
+    :return: Broker or a proxy with the same methods
+    """
+    tcp_address = parse_address(address)
+    if tcp_address is None:
+        return Broker(address)
+    if not authkey:
+        raise ValueError("An authkey is needed to connect to " + address)
+    manager = manager_class()
+    manager.register("broker")
+    client = manager(address=tcp_address, authkey=authkey)
+    client.connect()
+    return client.broker()
+
+
+def fetch_blob(broker, digest, blob_dir):
+    """
+    :return: path of a local copy of the blob, fetched from the broker unless blob_dir already holds it
+    """
+    path = os.path.join(blob_dir, digest)
+    if not os.path.exists(path):
+        data = broker.get_blob(digest)
+        if data is None or hashlib.sha256(data).hexdigest() != digest:
+            raise FileNotFoundError("Broker has no blob " + digest)
+        os.makedirs(blob_dir, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def resolve_blobs(broker, payload, blob_dir):
+    """
+    :return: payload with every {"blob": digest} value replaced by the path of a local copy
+    """
+    return {key: fetch_blob(broker, value["blob"], blob_dir) if isinstance(value, dict) and set(value) == {"blob"}
+            else value for key, value in payload.items()}
+
+
+def run_worker(broker, name=None, poll_seconds=1.0, idle_timeout=None, renew_seconds=None, blob_dir=None):
+    """
+    Lease and run jobs until interrupted, or until the queue has been empty for idle_timeout seconds. A job that
+    raises is reported to the broker and the worker carries on
+    :param name: worker name stored with its leases, defaults to host and process id
+    :param renew_seconds: how often to renew the lease of the running job, defaults to a third of the lease
+    :param blob_dir: where files fetched from the broker are cached, defaults to a directory under the temp directory
+    :return: number of jobs completed
+    """
+    name = name or "%s-%d" % (socket.gethostname(), os.getpid())
+    blob_dir = blob_dir or os.path.join(tempfile.gettempdir(), "spades-blobs")
+    if renew_seconds is None:
+        renew_seconds = broker.get_lease_seconds() / 3
+    completed = 0
+    idle_since = time.time()
+    while True:
+        job = broker.lease(name)
+        if job is None:
+            if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                return completed
+            time.sleep(poll_seconds)
+            continue
+        job_id, kind, payload = job
+        finished = threading.Event()
+        renewer = threading.Thread(target=keep_leased, args=(broker, job_id, name, renew_seconds, finished),
+                                   daemon=True)
+        renewer.start()
+        try:
+            result = JOB_KINDS[kind](**resolve_blobs(broker, payload, blob_dir))
+        except Exception as error:
+            broker.fail(job_id, name, "%s: %s" % (type(error).__name__, error))
+            idle_since = time.time()
+            continue
+        finally:
+            finished.set()
+            renewer.join()
+        broker.complete(job_id, name, result)
+        completed += 1
+        idle_since = time.time()
+
+
+def keep_leased(broker, job_id, worker, renew_seconds, finished):
+    while not finished.wait(renew_seconds):
+        if not broker.renew(job_id, worker):
+            return
+
+
+def wait_for(broker, job_ids, poll_seconds=1.0, timeout=None):
+    """
+    :return: list of results in the order of job_ids
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        errors = broker.errors(job_ids)
+        if errors:
+            job_id, error = next(iter(errors.items()))
+            raise RuntimeError("%d of %d jobs failed, job %d: %s" % (len(errors), len(job_ids), job_id, error))
+        done = broker.results(job_ids)
+        if len(done) == len(job_ids):
+            return [done[job_id] for job_id in job_ids]
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError("%d of %d jobs not done" % (len(job_ids) - len(done), len(job_ids)))
+        time.sleep(poll_seconds)
+
+
+def submit_evaluation(broker, agent, num_games, batch_size=100, num_players=2, seed=0, early_termination=False):
+    """
+    Split an evaluation into batches of batch_size games, each with its own seed. A checkpoint is read here and sent
+    through the broker, so workers don't need access to its path
+    :param agent: checkpoint path or "random"
+    :return: list of job ids
+    """
+    from tournament import RANDOM_AGENT
+    if agent != RANDOM_AGENT:
+        with open(agent, "rb") as f:
+            agent = {"blob": broker.put_blob(f.read())}
+    job_ids = []
+    for batch, start in enumerate(range(0, num_games, batch_size)):
+        payload = {"agent": agent, "num_players": num_players, "games": min(batch_size, num_games - start),
+                   "seed": seed * 1000003 + batch, "early_termination": early_termination}
+        job_ids.append(broker.submit("evaluate", payload))
+    return job_ids
+
+
+def combine_evaluations(results):
+    """
+    :param results: evaluate_batch results
+    :return: the same dict as evaluation.evaluate over all their games
+    """
+    games = sum(result["games"] for result in results)
+    wins = sum(result["wins"] for result in results)
+    tricks = sum(result["mean_tricks"] * result["games"] for result in results)
+    return {"games": games, "wins": wins, "win_rate": wins / games, "mean_tricks": tricks / games}